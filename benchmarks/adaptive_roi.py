@@ -0,0 +1,92 @@
+"""
+Reports how often AdaptiveROI skips the landmarks prediction on the synthetic
+corpus, and what it costs in accuracy.
+
+The synthetic landmarks stand in for the predictor: the full run uses the
+true landmarks of every frame, the adaptive run reuses those of the last
+predicted frame whenever AdaptiveROI allows it. Both runs report the pupil
+error against the true iris centers, and the adaptive run how many of its
+directions differ from the full run.
+
+    python -m benchmarks.adaptive_roi
+    python -m benchmarks.adaptive_roi --frames 400 --max-motion 0.5 --head-motion 0.5
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from gaze_tracking.direction import determine_eye_direction
+from gaze_tracking.eye import Eye
+from gaze_tracking.roi import AdaptiveROI
+
+from .corpus import iris_centers, synthetic_frames, to_landmarks
+from .run import EYES, calibrated
+
+
+def analyze(gray, landmarks, calibration):
+    """Returns (pupil coordinates, directions, lowest pupil confidence) of both eyes."""
+    pupils, directions, confidence = [], [], 1.0
+    for side, points, groups in EYES:
+        eye = Eye(gray, landmarks, side, calibration)
+        if eye.pupil.x is None:
+            pupils.append(None)
+            directions.append(None)
+            confidence = 0.0
+            continue
+        coords = (eye.origin[0] + eye.pupil.x, eye.origin[1] + eye.pupil.y)
+        pupils.append(coords)
+        directions.append(determine_eye_direction(points, eye, coords, True, calibration, groups)[0])
+        confidence = min(confidence, eye.pupil.confidence)
+    return pupils, directions, confidence
+
+
+def errors(pupils, truth):
+    return [np.hypot(p[0] - t[0], p[1] - t[1]) for p, t in zip(pupils, truth) if p is not None]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=240, help="Number of synthetic frames")
+    parser.add_argument("--head-motion", type=float, default=1.0, help="Scale of the synthetic head movements")
+    parser.add_argument("--max-motion", type=float, default=1.0, help="See AdaptiveROI")
+    parser.add_argument("--min-confidence", type=float, default=0.5, help="See AdaptiveROI")
+    parser.add_argument("--max-skip", type=int, default=15, help="See AdaptiveROI")
+    args = parser.parse_args()
+
+    corpus = synthetic_frames(args.frames, head_motion=args.head_motion)
+    frames = [(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), to_landmarks(points)) for frame, points in corpus]
+    truth = [iris_centers(points, index) for index, (_, points) in enumerate(corpus)]
+    roi = AdaptiveROI(args.max_motion, args.min_confidence, args.max_skip)
+
+    full_calibration, adaptive_calibration = calibrated(frames), calibrated(frames)
+    full_errors, adaptive_errors, differences, gate_ms = [], [], 0, []
+    landmarks, confidence = None, 0.0
+    for (gray, true_landmarks), centers in zip(frames, truth):
+        pupils, full_directions, _ = analyze(gray, true_landmarks, full_calibration)
+        full_errors += errors(pupils, centers)
+
+        start = time.perf_counter()
+        reuse = landmarks is not None and roi.reusable(gray, confidence)
+        gate_ms.append((time.perf_counter() - start) * 1000)
+        if not reuse:
+            landmarks = true_landmarks  # A full prediction
+            roi.update(gray, landmarks)
+        pupils, directions, confidence = analyze(gray, landmarks, adaptive_calibration)
+        adaptive_errors += errors(pupils, centers)
+        differences += directions != full_directions
+
+    summary = roi.summary()
+    print(f"corpus: synthetic ({len(frames)} frames, head motion x{args.head_motion})")
+    print(f"skip rate: {summary['skip_rate']:.1%} ({summary['skipped']} frames), "
+          f"gate {np.mean(gate_ms):.3f} ms/frame, fallbacks {summary['fallbacks']}")
+    print(f"{'run':<10}{'mean px':>10}{'p95 px':>10}{'located':>10}")
+    for name, values in (("full", full_errors), ("adaptive", adaptive_errors)):
+        print(f"{name:<10}{np.mean(values):>10.2f}{np.percentile(values, 95):>10.2f}"
+              f"{len(values) / (2 * len(frames)):>10.1%}")
+    print(f"directions differing from the full run: {differences} frames ({differences / len(frames):.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Compares the per-eye pupil path (one Pupil per eye frame) with Pupil.batch,
+which smooths and binarizes all the eye frames of a frame in one tile.
+
+For every engine, it reports the latency per frame of both paths and checks
+that they locate the same pupils. `--faces` packs the eyes of several copies
+of the face in the same batch, as for several tracked faces.
+
+    python -m benchmarks.batched_eyes
+    python -m benchmarks.batched_eyes --faces 4 --engines contours
+"""
+import argparse
+
+import cv2
+
+from gaze_tracking.eye import isolate_region
+from gaze_tracking.pupil import Pupil
+
+from .corpus import synthetic_frames, to_landmarks
+from .run import EYES, calibrated, measure
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=200, help="Number of synthetic frames")
+    parser.add_argument("--faces", type=int, default=1, help="Number of faces per frame")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed passes per path")
+    parser.add_argument("--engines", nargs="+", default=list(Pupil.ENGINES), choices=Pupil.ENGINES)
+    args = parser.parse_args()
+
+    corpus = synthetic_frames(args.frames)
+    frames = [(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), to_landmarks(points)) for frame, points in corpus]
+
+    calibration = calibrated(frames)
+
+    samples = []  # (eye frames, thresholds) of each frame
+    for gray, landmarks in frames:
+        crops, thresholds = [], []
+        for side, points, _ in EYES:
+            crops.append(isolate_region(gray, landmarks[points])[0])
+            thresholds.append(calibration.threshold(side))
+        samples.append((crops * args.faces, thresholds * args.faces))
+
+    print(f"corpus: synthetic ({len(frames)} frames, {2 * args.faces} eyes per frame)")
+    print(f"{'engine':<12}{'unbatched ms':>14}{'batch ms':>12}{'saving':>10}{'same':>8}")
+    for engine in args.engines:
+        def per_eye(sample):
+            return [Pupil(crop, threshold, engine=engine) for crop, threshold in zip(*sample)]
+
+        def batched(sample):
+            return Pupil.batch(sample[0], sample[1], engine=engine)
+
+        same = all([p.subpixel for p in per_eye(sample)] == [p.subpixel for p in batched(sample)]
+                   for sample in samples)
+        single = measure(per_eye, samples, args.repeat)
+        batch = measure(batched, samples, args.repeat)
+        saving = 1 - batch["p50_ms"] / single["p50_ms"]
+        print(f"{engine:<12}{single['p50_ms']:>14.3f}{batch['p50_ms']:>12.3f}{saving:>10.1%}{str(same):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compares the per-threshold calibration search with the single-pass search
+of Calibration.find_best_threshold, on synthetic or recorded eye crops.
+
+    python -m benchmarks.calibration_threshold
+    python -m benchmarks.calibration_threshold --crops path/to/eye_crops
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from gaze_tracking.calibration import Calibration
+from gaze_tracking.pupil import Pupil
+
+
+def legacy_find_best_threshold(eye_frame):
+    """The original search: one full image_processing call per threshold."""
+    average_iris_size = 0.48
+    trials = {}
+    for threshold in range(5, 100, 5):
+        iris_frame = Pupil.image_processing(eye_frame, threshold)
+        trials[threshold] = Calibration.iris_size(iris_frame)
+    best_threshold, _ = min(trials.items(), key=lambda p: abs(p[1] - average_iris_size))
+    return best_threshold
+
+
+def synthetic_eye_crops(count, seed=0):
+    """Generates eye-like grayscale crops: bright sclera, dark iris, masked corners."""
+    rng = np.random.default_rng(seed)
+    crops = []
+    for _ in range(count):
+        width = int(rng.integers(30, 70))
+        height = int(rng.integers(18, 35))
+        crop = np.full((height, width), int(rng.integers(120, 220)), np.uint8)
+        center = (int(rng.integers(width // 4, 3 * width // 4)), height // 2)
+        radius = int(rng.integers(height // 4, height // 2))
+        cv2.circle(crop, center, radius, int(rng.integers(10, 80)), -1)
+        noise = rng.normal(0, 8, crop.shape)
+        crop = np.clip(crop + noise, 0, 255).astype(np.uint8)
+        crop[:5, :] = 255
+        crop[-5:, :] = 255
+        crops.append(crop)
+    return crops
+
+
+def load_crops(directory):
+    """Loads every image of a directory as a grayscale eye crop."""
+    paths = sorted(glob.glob(os.path.join(directory, "*")))
+    crops = [cv2.imread(path, cv2.IMREAD_GRAYSCALE) for path in paths]
+    return [crop for crop in crops if crop is not None]
+
+
+def time_per_call(function, crops, repeat):
+    """Returns the results and the mean milliseconds per call."""
+    results = [function(crop) for crop in crops]  # Warm-up and results
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for crop in crops:
+            function(crop)
+    elapsed = time.perf_counter() - start
+    return results, elapsed * 1000 / (repeat * len(crops))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--crops", help="Directory of grayscale eye crops (synthetic crops if omitted)")
+    parser.add_argument("--count", type=int, default=200, help="Number of synthetic crops")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed passes over the crops")
+    args = parser.parse_args()
+
+    crops = load_crops(args.crops) if args.crops else synthetic_eye_crops(args.count)
+    legacy, legacy_ms = time_per_call(legacy_find_best_threshold, crops, args.repeat)
+    current, current_ms = time_per_call(Calibration.find_best_threshold, crops, args.repeat)
+
+    mismatches = sum(a != b for a, b in zip(legacy, current))
+    print(f"crops:      {len(crops)}")
+    print(f"legacy:     {legacy_ms:.3f} ms per crop")
+    print(f"vectorized: {current_ms:.3f} ms per crop")
+    print(f"speedup:    {legacy_ms / current_ms:.1f}x")
+    print(f"mismatches: {mismatches}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
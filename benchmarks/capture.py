@@ -0,0 +1,130 @@
+"""
+Measures the memory traffic of the capture path, from the camera read to the
+grayscale frame given to the tracker, with and without BufferedCapture.
+
+    baseline   read() allocates a BGR frame, cvtColor a grayscale one, and
+               annotated_frame() copies the BGR frame again
+    ring-bgr   BGR frames read into recycled buffers, the grayscale frame
+               converted into a reused buffer
+    ring-gray  only the luminance is kept, in recycled buffers (headless)
+
+For every path, it reports the time per frame, the bytes newly allocated per
+frame (tracemalloc peak), the bytes written per frame and the frame bytes
+handed to the next stages. The synthetic source allocates a new frame per
+read() like a camera driver does, and fills the given buffer otherwise.
+
+    python -m benchmarks.capture
+    python -m benchmarks.capture --source 0 --frames 300   # a camera
+"""
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from gaze_tracking.capture import BufferedCapture
+
+from .corpus import synthetic_frames
+
+
+class SyntheticCamera:
+    """Serves synthetic frames with the buffer semantics of cv2.VideoCapture.read()."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.served = 0
+
+    def read(self, image=None):
+        frame = self.frames[self.served % len(self.frames)]
+        self.served += 1
+        if image is None or image.shape != frame.shape:
+            return True, frame.copy()
+        np.copyto(image, frame)
+        return True, image
+
+    def get(self, prop):
+        return 0.0
+
+    def set(self, prop, value):
+        return False
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+
+def open_source(source, frames):
+    if source == "synthetic":
+        return SyntheticCamera([frame for frame, _ in synthetic_frames(frames)])
+    return cv2.VideoCapture(int(source) if source.isdigit() else source)
+
+
+def run(path, capture, count):
+    """Returns (ms, allocated bytes, written bytes, handed bytes) per frame of a path."""
+    recycle = None
+    if path == "baseline":
+        def step():
+            _, frame = capture.read()
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            annotated = frame.copy()
+            return frame, gray.nbytes + annotated.nbytes
+    else:
+        buffered = BufferedCapture(capture, gray=path == "ring-gray")
+        recycle = buffered.recycle
+        gray = None
+
+        def step():
+            nonlocal gray
+            _, frame = buffered.read()
+            if frame.ndim == 2:  # The camera still wrote a BGR frame, unless it delivers raw YUYV
+                return frame, 0 if buffered.raw else 3 * frame.nbytes
+            if gray is None:
+                gray = np.empty(frame.shape[:2], np.uint8)
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+            return frame, gray.nbytes
+
+    for _ in range(10):  # Warm-up, allocates the buffers
+        frame, _ = step()
+        if recycle is not None:
+            recycle(frame)
+
+    allocated, written, handed, elapsed = [], [], [], 0.0
+    tracemalloc.start()
+    for _ in range(count):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        frame, derived = step()
+        elapsed += time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        allocated.append(peak - before)
+        written.append(frame.nbytes + derived)
+        handed.append(frame.nbytes)
+        if recycle is not None:
+            recycle(frame)
+        del frame
+    tracemalloc.stop()
+    return elapsed * 1000 / count, np.mean(allocated), np.mean(written), np.mean(handed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default="synthetic", help="'synthetic', a camera index or a video file")
+    parser.add_argument("--frames", type=int, default=200, help="Number of frames per path")
+    args = parser.parse_args()
+
+    print(f"source: {args.source} ({args.frames} frames per path)")
+    print(f"{'path':<12}{'ms/frame':>10}{'alloc KiB':>12}{'written KiB':>13}{'handed KiB':>12}{'alloc MB/s':>12}")
+    for path in ("baseline", "ring-bgr", "ring-gray"):
+        capture = open_source(args.source, args.frames)
+        milliseconds, allocated, written, handed = run(path, capture, args.frames)
+        capture.release()
+        print(f"{path:<12}{milliseconds:>10.3f}{allocated / 1024:>12.1f}{written / 1024:>13.1f}{handed / 1024:>12.1f}"
+              f"{allocated / milliseconds / 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Frame corpora for the benchmarks: deterministic synthetic faces with known
+68-point landmarks, or recorded frames loaded from a video or image directory.
+"""
+import os
+
+import cv2
+import numpy as np
+
+from gaze_tracking.simulation import iris_centers, synthetic_face
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def synthetic_frames(count=120, size=(640, 480), seed=0, head_motion=1.0):
+    """Generates the frames of gaze_tracking.simulation.synthetic_face().
+
+    Arguments:
+        count (int): Number of frames
+        size (tuple): (width, height) of the frames
+        seed (int): Seed of the sensor noise
+        head_motion (float): Scale of the head movements, 0 for a still head
+
+    Returns:
+        list: (BGR frame, list of 68 (x, y) landmarks) tuples
+    """
+    return list(synthetic_face(count, size, seed, head_motion))
+
+
+def recorded_frames(path, limit=None):
+    """Loads BGR frames from a video file or an image directory.
+
+    Arguments:
+        path (str): Video file or directory of images
+        limit (int): Maximum number of frames, all of them if None
+
+    Returns:
+        list: (BGR frame, None) tuples, landmarks being unknown
+    """
+    frames = []
+    if os.path.isdir(path):
+        names = sorted(name for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS))
+        for name in names[:limit]:
+            frame = cv2.imread(os.path.join(path, name))
+            if frame is not None:
+                frames.append((frame, None))
+        return frames
+
+    capture = cv2.VideoCapture(path)
+    while limit is None or len(frames) < limit:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frames.append((frame, None))
+    capture.release()
+    return frames
+
+
+def to_landmarks(points):
+    """Converts a list of (x, y) points to the (68, 2) int32 array used by the tracker."""
+    return np.array(points, np.int32)
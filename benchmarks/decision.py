@@ -0,0 +1,79 @@
+"""
+Compares the direction decision of the former 10-frame majority batches with
+the streaming DecisionEngine modes, on the eye directions of the synthetic
+corpus. A share of the per-eye directions can be replaced by random ones to
+simulate a noisy camera.
+
+For every method, it reports the number of decision changes (flips), the
+flip rate, and the mean delay in frames between both eyes agreeing on a new
+direction and the decision following them.
+
+    python -m benchmarks.decision
+    python -m benchmarks.decision --frames 400 --noise 0.3
+"""
+import argparse
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from gaze_tracking.decision import CHOICES, UNKNOWN, DecisionEngine, DecisionMetrics
+
+from .corpus import synthetic_frames, to_landmarks
+from .run import calibrated, eye_outputs
+
+
+def batch_decisions(directions, size=10):
+    """The former decision: the most common direction of each eye over batches
+    of `size` frames, updated once per batch, "Unknown" if the eyes disagree."""
+    metrics, decision = DecisionMetrics(), UNKNOWN
+    left_history, right_history = [], []
+    for left, right in directions:
+        left_history.append(left)
+        right_history.append(right)
+        if len(left_history) == size:
+            left_most = Counter(left_history).most_common(1)[0][0]
+            right_most = Counter(right_history).most_common(1)[0][0]
+            left_history, right_history = [], []
+            decision = left_most if left_most == right_most else UNKNOWN
+        metrics.record(left if left == right and left in CHOICES else None, decision)
+    return metrics
+
+
+def engine_decisions(directions, mode):
+    engine = DecisionEngine(mode=mode)
+    for left, right in directions:
+        engine.update(left, right)
+    return engine.metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=240, help="Number of synthetic frames")
+    parser.add_argument("--noise", type=float, default=0.2, help="Share of per-eye directions made random")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = synthetic_frames(args.frames)
+    frames = [(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), to_landmarks(points)) for frame, points in corpus]
+    outputs = eye_outputs(frames, calibrated(frames))
+
+    rng = np.random.default_rng(args.seed)
+    directions = []
+    for record in outputs:
+        directions.append(tuple(rng.choice(CHOICES) if rng.random() < args.noise else direction
+                                for direction in record["directions"]))
+
+    print(f"corpus: synthetic ({len(directions)} frames, noise {args.noise:.0%})")
+    print(f"{'method':<12}{'flips':>8}{'flip rate':>11}{'delay frames':>14}")
+    results = [("batch10", batch_decisions(directions))]
+    results += [(mode, engine_decisions(directions, mode)) for mode in DecisionEngine.MODES]
+    for name, metrics in results:
+        summary = metrics.summary()
+        delay = summary["delay_frames"]
+        print(f"{name:<12}{summary['flips']:>8}{summary['flip_rate']:>11.3f}"
+              f"{delay if delay is not None else float('nan'):>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Reports face detection speed and detection rate for several detection scales,
+to pick the GazeTracking detection_scale/detection_upsample of a camera.
+
+The full resolution detection, without upsampling, is the reference: the
+detection rate is the share of its faces that are found at each scale, and
+the overlap is their mean intersection over union.
+
+    python -m benchmarks.detection_scale --corpus session.mp4
+    python -m benchmarks.detection_scale --corpus frames_dir/ --scales 1 0.5 0.25 --upsample 0 1
+"""
+import argparse
+import time
+
+import cv2
+import dlib
+import numpy as np
+
+from gaze_tracking.face_tracker import FaceTracker
+
+from .corpus import recorded_frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", required=True, help="Video file or image directory")
+    parser.add_argument("--frames", type=int, default=200, help="Maximum number of frames")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.75, 0.5, 0.35, 0.25])
+    parser.add_argument("--upsample", type=int, nargs="+", default=[0, 1])
+    args = parser.parse_args()
+
+    frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame, _ in recorded_frames(args.corpus, args.frames)]
+    detector = dlib.get_frontal_face_detector()
+    reference = [FaceTracker(detector, "detect").detect(frame) for frame in frames]
+    expected = sum(1 for faces in reference if faces)
+    height, width = frames[0].shape[:2]
+
+    print(f"corpus: {args.corpus} ({len(frames)} frames, {width}x{height}, {expected} with a face at full scale)")
+    print(f"{'scale':>6}{'upsample':>10}{'ms/frame':>10}{'fps':>8}{'rate':>8}{'overlap':>9}")
+    for upsample in args.upsample:
+        for scale in args.scales:
+            tracker = FaceTracker(detector, "detect", detection_scale=scale, detection_upsample=upsample)
+            durations, found, overlaps = [], 0, []
+            for frame, expected_faces in zip(frames, reference):
+                start = time.perf_counter()
+                faces = tracker.detect(frame)
+                durations.append((time.perf_counter() - start) * 1000)
+                if expected_faces and faces:
+                    found += 1
+                    overlaps.append(FaceTracker._overlap(expected_faces[0], faces[0]))
+            mean_ms = float(np.mean(durations))
+            rate = found / expected if expected else float("nan")
+            overlap = float(np.mean(overlaps)) if overlaps else float("nan")
+            print(f"{scale:>6.2f}{upsample:>10}{mean_ms:>10.2f}{1000 / mean_ms:>8.1f}{rate:>8.1%}{overlap:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Compares the accuracy and the speed of the pupil engines (see Pupil.ENGINES)
+on the synthetic corpus, whose iris centers are known.
+
+For every engine, it reports the detection rate, the mean and 95th percentile
+distance between the detected pupil and the true iris center, the mean
+confidence, and the latency of Pupil on the isolated eye frames.
+
+    python -m benchmarks.pupil_engines
+    python -m benchmarks.pupil_engines --frames 400 --engines contours components
+"""
+import argparse
+
+import cv2
+import numpy as np
+
+from gaze_tracking.eye import isolate_region
+from gaze_tracking.pupil import Pupil
+
+from .corpus import iris_centers, synthetic_frames, to_landmarks
+from .run import EYES, calibrated, measure
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=200, help="Number of synthetic frames")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed passes per engine")
+    parser.add_argument("--engines", nargs="+", default=list(Pupil.ENGINES), choices=Pupil.ENGINES)
+    args = parser.parse_args()
+
+    corpus = synthetic_frames(args.frames)
+    frames = [(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), to_landmarks(points)) for frame, points in corpus]
+
+    calibration = calibrated(frames)
+
+    samples = []  # (eye frame, threshold, true center in the eye frame)
+    for index, ((gray, landmarks), (_, points)) in enumerate(zip(frames, corpus)):
+        for (side, eye_points, _), center in zip(EYES, iris_centers(points, index)):
+            crop, (x, y) = isolate_region(gray, landmarks[eye_points])
+            samples.append((crop, calibration.threshold(side), (center[0] - x, center[1] - y)))
+
+    print(f"corpus: synthetic ({len(frames)} frames, {len(samples)} eyes)")
+    print(f"{'engine':<12}{'rate':>8}{'mean px':>10}{'p95 px':>10}{'conf':>8}{'p50 ms':>10}{'p95 ms':>10}{'fps':>10}")
+    for engine in args.engines:
+        errors, confidences = [], []
+        for crop, threshold, center in samples:
+            pupil = Pupil(crop, threshold, engine=engine)
+            if pupil.subpixel is not None:
+                errors.append(np.hypot(pupil.subpixel[0] - center[0], pupil.subpixel[1] - center[1]))
+                confidences.append(pupil.confidence)
+
+        stats = measure(lambda sample: Pupil(sample[0], sample[1], engine=engine), samples, args.repeat)
+        rate = len(errors) / len(samples)
+        mean = float(np.mean(errors)) if errors else float("nan")
+        p95 = float(np.percentile(errors, 95)) if errors else float("nan")
+        confidence = float(np.mean(confidences)) if confidences else float("nan")
+        print(f"{engine:<12}{rate:>8.1%}{mean:>10.2f}{p95:>10.2f}{confidence:>8.2f}"
+              f"{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['fps']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Headless benchmark and golden-output regression check of the gaze pipeline.
+
+Each stage runs over a frame corpus and reports latency percentiles, frames per
+second and peak memory. The pupil coordinates, thresholds and directions are
+then compared with a golden file, and any difference fails the run.
+
+    python -m benchmarks.run                           # synthetic corpus
+    python -m benchmarks.run --corpus session.mp4      # recorded corpus, needs the landmarks model
+    python -m benchmarks.run --update-golden           # accept the current outputs
+"""
+import argparse
+import json
+import os
+import resource
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from gaze_tracking import models
+from gaze_tracking.calibration import Calibration
+from gaze_tracking.direction import LEFT_EYE_GROUPS, RIGHT_EYE_GROUPS, determine_eye_direction
+from gaze_tracking.eye import Eye, isolate_region
+from gaze_tracking.pupil import Pupil
+
+from .corpus import recorded_frames, synthetic_frames, to_landmarks
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "golden")
+EYES = ((0, Eye.LEFT_EYE_POINTS, LEFT_EYE_GROUPS), (1, Eye.RIGHT_EYE_POINTS, RIGHT_EYE_GROUPS))
+
+
+def measure(function, items, repeat=3):
+    """Calls function on every item, `repeat` times, and returns the stage statistics."""
+    for item in items[:5]:  # Warm-up
+        function(item)
+
+    samples = []
+    for _ in range(repeat):
+        for item in items:
+            start = time.perf_counter()
+            function(item)
+            samples.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    for item in items:
+        function(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples = np.array(samples)
+    return {
+        "calls": len(samples),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "fps": float(1000 / samples.mean()),
+        "peak_kib": peak / 1024,
+    }
+
+
+def calibrated(frames, nb_frames=20):
+    """Returns a Calibration completed on the first frames of the corpus."""
+    calibration = Calibration()
+    calibration.nb_frames = min(nb_frames, len(frames))
+    for gray, landmarks in frames[:calibration.nb_frames]:
+        Eye(gray, landmarks, 0, calibration)
+        Eye(gray, landmarks, 1, calibration)
+    return calibration
+
+
+def eye_outputs(frames, calibration):
+    """Returns the golden outputs of the eye stages for every frame."""
+    outputs = []
+    for gray, landmarks in frames:
+        record = {"pupils": [], "thresholds": [], "directions": []}
+        for side, points, groups in EYES:
+            eye = Eye(gray, landmarks, side, calibration)
+            record["thresholds"].append(eye.pupil.threshold)
+            if eye.pupil.x is None:
+                record["pupils"].append(None)
+                record["directions"].append(None)
+                continue
+            coords = (eye.origin[0] + eye.pupil.x, eye.origin[1] + eye.pupil.y)
+            record["pupils"].append(list(coords))
+            record["directions"].append(determine_eye_direction(points, eye, coords, True, calibration, groups)[0])
+        outputs.append(record)
+    return outputs
+
+
+def run_refresh(corpus, repeat, model_path):
+    """Benchmarks GazeTracking.refresh and returns (stats, landmark frames, outputs)."""
+    from gaze_tracking import GazeTracking
+    from gaze_tracking.direction import gaze_directions
+
+    gaze = GazeTracking(model_path=model_path)
+    stats = measure(gaze.refresh, [frame for frame, _ in corpus], repeat)
+
+    gaze = GazeTracking(model_path=model_path)
+    frames, outputs = [], []
+    for frame, _ in corpus:
+        gaze.refresh(frame)
+        if gaze.face is not None:
+            frames.append((cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), gaze.landmarks))
+        pupils = [gaze.pupil_left_coords(), gaze.pupil_right_coords()]
+        outputs.append({
+            "pupils": [list(p) if p else None for p in pupils],
+            "directions": list(gaze_directions(gaze)),
+        })
+    return stats, frames, outputs
+
+
+def compare(outputs, golden):
+    """Returns the indexes of the frames whose outputs differ from the golden ones."""
+    if len(outputs) != len(golden):
+        return list(range(max(len(outputs), len(golden))))
+    return [index for index, (a, b) in enumerate(zip(outputs, golden)) if a != b]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Video file or image directory (synthetic corpus if omitted)")
+    parser.add_argument("--frames", type=int, default=120, help="Number of frames of the corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed passes per stage")
+    parser.add_argument("--golden", help="Golden output file (benchmarks/golden/<corpus>.json by default)")
+    parser.add_argument("--update-golden", action="store_true", help="Write the current outputs as golden")
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--model", default=models.DEFAULT_MODEL_PATH,
+                        help="Landmarks model, looked for like main.py --model does")
+    args = parser.parse_args()
+    model_path = models.resolve_model_path(args.model)
+
+    name = os.path.splitext(os.path.basename(os.path.normpath(args.corpus)))[0] if args.corpus else "synthetic"
+    golden_path = args.golden or os.path.join(GOLDEN_DIR, name + ".json")
+    report = {"corpus": name, "stages": {}}
+
+    if args.corpus:
+        if not os.path.isfile(model_path):
+            raise SystemExit(f"A recorded corpus needs the landmarks model {model_path} (see --model)")
+        corpus = recorded_frames(args.corpus, args.frames)
+        report["stages"]["refresh"], frames, outputs = run_refresh(corpus, args.repeat, model_path)
+    else:
+        corpus = synthetic_frames(args.frames)
+        frames = [(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), to_landmarks(points)) for frame, points in corpus]
+        outputs = None
+        if os.path.isfile(model_path):
+            report["stages"]["refresh"], _, _ = run_refresh(corpus, args.repeat, model_path)
+
+    if not frames:
+        raise SystemExit("No face found in the corpus")
+
+    calibration = calibrated(frames)
+    crops = [isolate_region(gray, landmarks[points])[0] for gray, landmarks in frames for _, points, _ in EYES]
+    threshold = calibration.threshold(0)
+
+    report["stages"]["eye"] = measure(lambda item: Eye(item[0], item[1], 0, calibration), frames, args.repeat)
+    report["stages"]["pupil"] = measure(lambda crop: Pupil(crop, threshold), crops, args.repeat)
+    report["stages"]["calibration"] = measure(Calibration.find_best_threshold, crops, args.repeat)
+    if outputs is None:
+        outputs = eye_outputs(frames, calibration)
+    report["peak_rss_mib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    print(f"corpus: {name} ({len(corpus)} frames)")
+    print(f"{'stage':<12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'fps':>10}{'peak KiB':>12}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<12}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}"
+              f"{stats['fps']:>10.1f}{stats['peak_kib']:>12.1f}")
+    print(f"peak RSS: {report['peak_rss_mib']:.1f} MiB")
+
+    if args.update_golden:
+        os.makedirs(os.path.dirname(golden_path), exist_ok=True)
+        with open(golden_path, "w") as file:
+            file.write("[\n" + ",\n".join(json.dumps(record) for record in outputs) + "\n]\n")
+        print(f"golden outputs written to {golden_path}")
+    elif os.path.exists(golden_path):
+        with open(golden_path) as file:
+            mismatches = compare(outputs, json.load(file))
+        report["golden_mismatches"] = len(mismatches)
+        print(f"golden: {len(mismatches)} mismatching frames" + (f" (first: {mismatches[:10]})" if mismatches else ""))
+    else:
+        print(f"golden: no {golden_path}, run with --update-golden to create it")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if report.get("golden_mismatches"):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
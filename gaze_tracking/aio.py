@@ -0,0 +1,167 @@
+"""
+asyncio API of the gaze tracker, to run it in an event loop next to other I/O.
+
+The blocking work (camera reads, face and pupil detection) runs in executor
+threads, so the event loop is never blocked:
+
+    async def control(capture):
+        tracker = AsyncGazeTracker(tracking_mode="landmarks")
+        async for event in tracker.events(AsyncFrameSource(capture)):
+            await vehicle.steer(event.directions)
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .direction import gaze_directions
+from .gaze_tracking import GazeTracking
+from .pipeline import FramePacket
+
+
+class GazeEvent:
+    """
+    What the tracker found on one frame, safe to keep after the next refresh.
+    """
+
+    __slots__ = ("index", "timestamp", "face", "pupils", "directions", "latency")
+
+    def __init__(self, index, timestamp, face, pupils, directions, latency):
+        self.index = index  # Sequence number of the frame
+        self.timestamp = timestamp  # Capture time, from time.perf_counter()
+        self.face = face  # (left, top, right, bottom) face rectangle, None if no face
+        self.pupils = pupils  # ((x, y) left, (x, y) right), None if not located
+        self.directions = directions  # (left, right) directions, (None, None) if not located
+        self.latency = latency  # Milliseconds from capture to the end of the analysis
+
+    def __repr__(self):
+        return f"GazeEvent(index={self.index}, directions={self.directions}, latency={self.latency:.1f} ms)"
+
+
+class AsyncFrameSource:
+    """
+    Async iterator of FramePacket over a blocking capture, e.g. cv2.VideoCapture
+    or ReplayCapture. Each read runs in an executor thread.
+    """
+
+    def __init__(self, capture, executor=None):
+        """
+        Arguments:
+            capture (cv2.VideoCapture): Any object with a read() -> (ok, frame) method
+            executor (concurrent.futures.Executor): Runs the reads, a dedicated thread if None
+        """
+        self.capture = capture
+        self._executor = executor or ThreadPoolExecutor(1, thread_name_prefix="capture")
+        self._owns_executor = executor is None
+        self._index = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        ok, image = await asyncio.get_running_loop().run_in_executor(self._executor, self.capture.read)
+        timestamp = time.perf_counter()
+        if not ok:
+            raise StopAsyncIteration
+        packet = FramePacket(self._index, timestamp, image)
+        self._index += 1
+        return packet
+
+    def close(self):
+        """Stops the reading thread, the capture itself is left open."""
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+
+class AsyncGazeTracker:
+    """
+    This class wraps a GazeTracking for asyncio. Frames are analyzed one at a
+    time on a dedicated thread, as a GazeTracking keeps state between frames.
+    """
+
+    def __init__(self, gaze=None, executor=None, **gaze_options):
+        """
+        Arguments:
+            gaze (GazeTracking): Tracker to wrap, a new one built from gaze_options if None
+            executor (concurrent.futures.ThreadPoolExecutor): Single-thread executor running
+                                                              the analysis, a dedicated one if None
+            gaze_options: Keyword arguments of GazeTracking
+        """
+        self.gaze = gaze or GazeTracking(**gaze_options)
+        self._executor = executor or ThreadPoolExecutor(1, thread_name_prefix="gaze")
+        self._owns_executor = executor is None
+        self.dropped = 0  # Number of frames dropped by events()
+        self._lock = asyncio.Lock()
+
+    def _analyze(self, packet):
+        """Runs in the executor: refreshes the tracker and captures its results."""
+        result = self.gaze.refresh(packet.image, packet.timestamp)
+        pupils = (result.pupil_left, result.pupil_right) if result.pupils_located else None
+        latency = (time.perf_counter() - packet.timestamp) * 1000
+        return GazeEvent(packet.index, packet.timestamp, result.face, pupils, gaze_directions(self.gaze), latency)
+
+    async def refresh(self, frame):
+        """Analyzes a frame without blocking the event loop.
+
+        Argument:
+            frame (numpy.ndarray or FramePacket): BGR frame, or a packet from AsyncFrameSource
+
+        Returns:
+            GazeEvent: Results of the frame
+        """
+        if not isinstance(frame, FramePacket):
+            frame = FramePacket(0, time.perf_counter(), frame)
+        async with self._lock:  # Keeps frames in order when refresh is awaited concurrently
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self._analyze, frame)
+
+    async def events(self, source, maxsize=1, drop=True):
+        """Analyzes the frames of a source and yields an event per analyzed frame.
+
+        Frames are read ahead into a queue of `maxsize` frames. When it is full,
+        the oldest frame is dropped if `drop` is True (live cameras, the freshest
+        frame wins), otherwise reading waits for the consumer (recordings, every
+        frame is analyzed). Cancelling the consumer or leaving the loop stops
+        the reading task.
+
+        Arguments:
+            source (AsyncFrameSource): Any async iterator of FramePacket
+            maxsize (int): Number of frames read ahead
+            drop (bool): Drop the oldest frame instead of waiting when the queue is full
+
+        Yields:
+            GazeEvent: Results of each analyzed frame
+        """
+        frames = asyncio.Queue(maxsize)
+        failures = []
+        end = object()
+
+        async def read():
+            try:
+                async for packet in source:
+                    if drop and frames.full():
+                        frames.get_nowait()
+                        self.dropped += 1
+                    await frames.put(packet)
+            except Exception as e:
+                failures.append(e)
+            await frames.put(end)  # Waits for the consumer: the last frames are not dropped for it
+
+        reader = asyncio.create_task(read())
+        try:
+            while True:
+                packet = await frames.get()
+                if packet is end:
+                    break
+                yield await self.refresh(packet)
+        finally:
+            reader.cancel()
+            try:
+                await reader
+            except asyncio.CancelledError:
+                pass
+        if failures:
+            raise failures[0]
+
+    def close(self):
+        """Stops the analysis thread once the frame being analyzed is done."""
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,256 @@
+"""
+Offline processing of recorded sessions (video files or image directories).
+
+Frames are split into fixed-size chunks of consecutive frames, the chunks are
+spread over a process pool with one GazeTracking instance per worker, and the
+per-frame results are streamed to CSV, JSONL or Parquet in frame order.
+
+    python -m gaze_tracking.batch session1.mp4 frames_dir/ -o results.csv --workers 8
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+
+import cv2
+
+from .direction import gaze_directions
+from .gaze_tracking import GazeTracking
+from .pupil import Pupil
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+FIELDS = [
+    "source", "frame", "time_ms", "face",
+    "pupil_left_x", "pupil_left_y", "pupil_right_x", "pupil_right_y",
+    "horizontal_ratio", "vertical_ratio", "blinking",
+    "left_direction", "right_direction", "calibrated",
+]
+
+IMAGE_FPS = 30.0  # Frame rate assumed for image directories, which carry no timestamps
+
+_worker_gaze = None  # GazeTracking instance of the current worker process
+
+
+def list_images(directory):
+    """Returns the sorted image paths of a directory."""
+    names = sorted(os.listdir(directory))
+    return [os.path.join(directory, name) for name in names if name.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+def frame_count(source):
+    """Returns the number of frames of a video file or image directory,
+    or None if the video does not report it."""
+    if os.path.isdir(source):
+        return len(list_images(source))
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise IOError(f"Cannot open video {source}")
+    count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+    return count if count > 0 else None
+
+
+def plan_chunks(sources, chunk_size):
+    """Splits the sources into (source, start, stop) chunks of consecutive frames.
+    The split only depends on the sources and chunk_size, never on the number of
+    workers, so the results are the same whatever the pool size."""
+    for source in sources:
+        count = frame_count(source)
+        if count is None:
+            yield source, 0, None
+            continue
+        for start in range(0, count, chunk_size):
+            yield source, start, min(start + chunk_size, count)
+
+
+def read_frames(source, start, stop):
+    """Yields (frame index, time in ms, BGR frame) for a chunk of a source."""
+    if os.path.isdir(source):
+        for index, path in enumerate(list_images(source)[start:stop], start):
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield index, None, frame
+        return
+
+    capture = cv2.VideoCapture(source)
+    if start:
+        capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+    index = start
+    try:
+        while stop is None or index < stop:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield index, capture.get(cv2.CAP_PROP_POS_MSEC), frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def analyze_frame(gaze, source, index, time_ms, frame):
+    """Refreshes the tracker with a frame and returns its result row."""
+    # Blinks and brow raises are timed on the video, not on the processing
+    timestamp = time_ms / 1000 if time_ms is not None else index / IMAGE_FPS
+    result = gaze.refresh(frame, timestamp)
+    row = dict.fromkeys(FIELDS)
+    row.update(source=source, frame=index, time_ms=time_ms, face=result.face is not None,
+               calibrated=gaze.calibration.is_complete(), blinking=result.blinking)
+    if result.pupils_located:
+        row["pupil_left_x"], row["pupil_left_y"] = result.pupil_left
+        row["pupil_right_x"], row["pupil_right_y"] = result.pupil_right
+        row["horizontal_ratio"] = result.horizontal_ratio
+        row["vertical_ratio"] = result.vertical_ratio
+        row["left_direction"], row["right_direction"] = gaze_directions(gaze)
+    return row
+
+
+def _init_worker(gaze_options):
+    global _worker_gaze
+    _worker_gaze = GazeTracking(**gaze_options)
+
+
+def _process_chunk(chunk):
+    source, start, stop = chunk
+    _worker_gaze.reset()  # Every chunk starts from the same calibration, whichever worker runs it
+    return [analyze_frame(_worker_gaze, source, *frame) for frame in read_frames(source, start, stop)]
+
+
+def iter_results(sources, workers=None, chunk_size=500, **gaze_options):
+    """Yields one result row per frame, in source and frame order.
+
+    Arguments:
+        sources (list): Video files and/or image directories
+        workers (int): Number of worker processes, os.cpu_count() if None
+        chunk_size (int): Number of consecutive frames per task
+        gaze_options: Keyword arguments for GazeTracking
+    """
+    chunks = list(plan_chunks(sources, chunk_size))
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        _init_worker(gaze_options)
+        for chunk in chunks:
+            yield from _process_chunk(chunk)
+        return
+
+    with multiprocessing.Pool(min(workers, len(chunks)) or 1, _init_worker, (gaze_options,)) as pool:
+        for rows in pool.imap(_process_chunk, chunks):
+            yield from rows
+
+
+class _CsvWriter:
+    def __init__(self, path):
+        self._file = open(path, "w", newline="")
+        self._writer = csv.DictWriter(self._file, FIELDS)
+        self._writer.writeheader()
+
+    def write(self, row):
+        self._writer.writerow(row)
+
+    def close(self):
+        self._file.close()
+
+
+class _JsonlWriter:
+    def __init__(self, path):
+        self._file = open(path, "w")
+
+    def write(self, row):
+        self._file.write(json.dumps(row) + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path, batch_size=1000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet output requires pyarrow: pip install pyarrow") from e
+
+        self._pa = pa
+        self._schema = pa.schema([
+            ("source", pa.string()), ("frame", pa.int64()), ("time_ms", pa.float64()), ("face", pa.bool_()),
+            ("pupil_left_x", pa.int64()), ("pupil_left_y", pa.int64()),
+            ("pupil_right_x", pa.int64()), ("pupil_right_y", pa.int64()),
+            ("horizontal_ratio", pa.float64()), ("vertical_ratio", pa.float64()), ("blinking", pa.bool_()),
+            ("left_direction", pa.string()), ("right_direction", pa.string()), ("calibrated", pa.bool_()),
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._batch_size = batch_size
+        self._rows = []
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self._batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_table(self._pa.Table.from_pylist(self._rows, schema=self._schema))
+            self._rows = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+WRITERS = {"csv": _CsvWriter, "jsonl": _JsonlWriter, "parquet": _ParquetWriter}
+
+
+def process(sources, output, fmt=None, workers=None, chunk_size=500, **gaze_options):
+    """Processes the sources and streams the result rows to a file.
+
+    Arguments:
+        sources (list): Video files and/or image directories
+        output (str): Output file path
+        fmt (str): "csv", "jsonl" or "parquet", guessed from the output extension if None
+        workers (int): Number of worker processes, os.cpu_count() if None
+        chunk_size (int): Number of consecutive frames per task
+        gaze_options: Keyword arguments for GazeTracking
+
+    Returns:
+        int: Number of frames written
+    """
+    fmt = fmt or os.path.splitext(output)[1].lstrip(".").lower()
+    if fmt not in WRITERS:
+        raise ValueError("Invalid output format. Use one of: " + ", ".join(WRITERS))
+
+    writer = WRITERS[fmt](output)
+    count = 0
+    try:
+        for row in iter_results(sources, workers, chunk_size, **gaze_options):
+            writer.write(row)
+            count += 1
+    finally:
+        writer.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="+", help="Video files and/or image directories")
+    parser.add_argument("-o", "--output", required=True, help="Output file (.csv, .jsonl or .parquet)")
+    parser.add_argument("--format", choices=sorted(WRITERS), help="Output format, from the extension by default")
+    parser.add_argument("--workers", type=int, help="Number of worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Consecutive frames per task")
+    parser.add_argument("--tracking-mode", default="detect", choices=["detect", "landmarks", "correlation"])
+    parser.add_argument("--redetect-interval", type=int, default=30)
+    parser.add_argument("--detection-scale", type=float, default=1.0, help="Resize factor for face detection")
+    parser.add_argument("--detection-upsample", type=int, default=0, help="Upsamplings done by the face detector")
+    parser.add_argument("--pupil-engine", default="contours", choices=Pupil.ENGINES)
+    args = parser.parse_args()
+
+    count = process(args.sources, args.output, args.format, args.workers, args.chunk_size,
+                    tracking_mode=args.tracking_mode, redetect_interval=args.redetect_interval,
+                    detection_scale=args.detection_scale, detection_upsample=args.detection_upsample,
+                    pupil_engine=args.pupil_engine)
+    print(f"{count} frames written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
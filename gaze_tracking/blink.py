@@ -0,0 +1,101 @@
+import time
+from collections import deque
+
+
+class BlinkEvent:
+    """
+    A change of the eyes' state:
+        "blink": the eyes reopened after a closure shorter than long_closure
+        "closure": the eyes have been closed for long_closure seconds
+        "reopen": the eyes reopened after a long closure
+    """
+
+    __slots__ = ("kind", "start", "duration")
+
+    def __init__(self, kind, start, duration):
+        self.kind = kind
+        self.start = start  # Time the eyes closed, from time.perf_counter()
+        self.duration = duration  # Seconds the eyes have been closed
+
+    def __repr__(self):
+        return f"BlinkEvent({self.kind!r}, duration={self.duration:.3f} s)"
+
+
+class BlinkDetector:
+    """
+    This class follows whether the eyes are open or closed from their landmark
+    ratio (eye width / eye height, see Eye), frame after frame. The eyes close
+    when the ratio rises above close_ratio and reopen when it falls below
+    open_ratio, so a ratio hovering around one threshold does not flicker.
+    """
+
+    def __init__(self, close_ratio=3.8, open_ratio=3.4, long_closure=1.0, history=100):
+        """
+        Arguments:
+            close_ratio (float): Ratio above which open eyes are considered closed
+            open_ratio (float): Ratio below which closed eyes are considered open again
+            long_closure (float): Seconds of closure raising a "closure" event
+            history (int): Number of recent events kept in `events`
+        """
+        self.close_ratio = close_ratio
+        self.open_ratio = open_ratio
+        self.long_closure = long_closure
+        self.closed = False
+        self.closed_since = None  # time.perf_counter() the eyes closed at
+        self.closed_for = 0.0  # Seconds the eyes have been closed, 0 when open
+        self.blinks = 0  # Number of blinks so far
+        self.closures = 0  # Number of long closures so far
+        self.events = deque(maxlen=history)  # Recent BlinkEvent
+
+        self._closure_raised = False
+
+    @property
+    def long_closed(self):
+        """Returns True while the eyes have been closed for at least long_closure seconds."""
+        return self.closed and self.closed_for >= self.long_closure
+
+    def reset(self):
+        """Considers the eyes open."""
+        self.closed = False
+        self.closed_since = None
+        self.closed_for = 0.0
+        self._closure_raised = False
+
+    def update(self, ratio, timestamp=None):
+        """Updates the state with the ratio of a new frame.
+
+        Arguments:
+            ratio (float): Mean blinking ratio of both eyes, inf for a zero-height eye,
+                           None if no face was found (the state is kept)
+            timestamp (float): Time of the frame, time.perf_counter() if None
+
+        Returns:
+            list: BlinkEvent raised by this frame
+        """
+        if ratio is None:
+            return []
+        if timestamp is None:
+            timestamp = time.perf_counter()
+
+        events = []
+        if not self.closed:
+            if ratio > self.close_ratio:
+                self.closed = True
+                self.closed_since = timestamp
+            return events
+
+        self.closed_for = timestamp - self.closed_since
+        if ratio < self.open_ratio:
+            if self.closed_for >= self.long_closure:
+                events.append(BlinkEvent("reopen", self.closed_since, self.closed_for))
+            else:
+                self.blinks += 1
+                events.append(BlinkEvent("blink", self.closed_since, self.closed_for))
+            self.reset()
+        elif self.closed_for >= self.long_closure and not self._closure_raised:
+            self._closure_raised = True
+            self.closures += 1
+            events.append(BlinkEvent("closure", self.closed_since, self.closed_for))
+
+        self.events.extend(events)
+        return events
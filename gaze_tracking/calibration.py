@@ -1,8 +1,71 @@
 from __future__ import division
+import json
+import logging
+import time
 import cv2
 import numpy as np
 from .pupil import Pupil
 
+PROFILE_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+class RollingWindow:
+    """
+    A fixed-size window of the most recent values, with a running sum and sum
+    of squares so the mean and variance cost the same however long it runs.
+    """
+
+    def __init__(self, size: int):
+        self._values = np.zeros(size, np.float64)
+        self._index = 0
+        self._count = 0
+        self._sum = 0.0
+        self._sum_squares = 0.0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        return iter(self.values())
+
+    def append(self, value: float):
+        """Add a value, replacing the oldest one once the window is full."""
+        if self._count == len(self._values):
+            old = self._values[self._index]
+            self._sum -= old
+            self._sum_squares -= old * old
+        else:
+            self._count += 1
+        self._values[self._index] = value
+        self._index = (self._index + 1) % len(self._values)
+        self._sum += value
+        self._sum_squares += value * value
+
+    def values(self) -> list:
+        """Return the values of the window, oldest first."""
+        if self._count < len(self._values):
+            return self._values[:self._count].tolist()
+        return np.roll(self._values, -self._index).tolist()
+
+    def clear(self):
+        """Remove all the values."""
+        self._index = 0
+        self._count = 0
+        self._sum = 0.0
+        self._sum_squares = 0.0
+
+    def sum(self) -> float:
+        return self._sum
+
+    def mean(self) -> float:
+        return self._sum / self._count
+
+    def variance(self) -> float:
+        mean = self.mean()
+        return max(self._sum_squares / self._count - mean * mean, 0.0)
+
 
 class Calibration:
     """
@@ -10,11 +73,28 @@ class Calibration:
     best binarization threshold value for the person and the webcam.
     """
 
-    def __init__(self):
-        self.nb_frames = 20  # Number of frames used for calibration
-        self.thresholds_left = []  # List to store threshold values for the left eye
-        self.thresholds_right = []  # List to store threshold values for the right eye
-        self.eye_heights = []  # List to store the heights of the eyes
+    def __init__(self, nb_frames: int = 20, adapt_interval: int = 0, lighting_tolerance: float = 30.0):
+        """
+        Arguments:
+            nb_frames (int): Number of frames used for calibration, also the size of
+                             the rolling windows the thresholds are averaged over
+            adapt_interval (int): Once calibrated, one frame out of adapt_interval is still
+                                  evaluated to follow lighting changes (0 to stop adapting)
+            lighting_tolerance (float): Largest difference of mean eye-region intensity (0-255)
+                                        between a loaded profile and the first eye frame before
+                                        the profile is dropped and the calibration restarts
+        """
+        self.nb_frames = nb_frames  # Number of frames used for calibration
+        self.adapt_interval = adapt_interval
+        self.lighting_tolerance = lighting_tolerance
+        self.thresholds_left = RollingWindow(nb_frames)  # Recent threshold values for the left eye
+        self.thresholds_right = RollingWindow(nb_frames)  # Recent threshold values for the right eye
+        self.eye_heights = RollingWindow(2 * nb_frames)  # Recent heights of the eyes
+        self.brightness = RollingWindow(2 * nb_frames)  # Recent mean intensities of the eye frames
+        self.metadata = {}  # Camera and lighting conditions of a loaded profile
+        self._frames = [0, 0]  # Frames seen per side since calibration completed
+        self._profile = None  # Profile loaded with from_dict, restored by reset()
+        self._check_lighting = False  # The next evaluated frame is compared with the profile brightness
 
     def is_complete(self) -> bool:
         """Check if calibration is completed by ensuring enough frames have been processed"""
@@ -27,15 +107,30 @@ class Calibration:
             side (int): 0 for left eye, 1 for right eye
         """
         if side == 0:
-            return int(sum(self.thresholds_left) / len(self.thresholds_left))
+            return int(self.thresholds_left.sum() / len(self.thresholds_left))
         elif side == 1:
-            return int(sum(self.thresholds_right) / len(self.thresholds_right))
+            return int(self.thresholds_right.sum() / len(self.thresholds_right))
         else:
             raise ValueError("Invalid value for side. Use 0 for left eye and 1 for right eye.")
 
     def get_avg_height(self) -> float:
         """Calculate and return the average height of the eyes during calibration"""
-        return np.mean(self.eye_heights)
+        return self.eye_heights.mean()
+
+    def needs_evaluation(self, side: int) -> bool:
+        """Check if the current eye frame should be evaluated: always until calibration
+        is complete or while the lighting of a loaded profile is unchecked, then one
+        frame out of adapt_interval.
+
+        Argument:
+            side (int): 0 for left eye, 1 for right eye
+        """
+        if not self.is_complete() or self._check_lighting:
+            return True
+        if not self.adapt_interval:
+            return False
+        self._frames[side] += 1
+        return self._frames[side] % self.adapt_interval == 0
 
     @staticmethod
     def iris_size(frame: np.ndarray) -> float:
@@ -50,6 +145,27 @@ class Calibration:
         num_blacks = num_pixels - cv2.countNonZero(frame)  # Number of black pixels
         return num_blacks / num_pixels  # Ratio of black pixels to total pixels
 
+    @staticmethod
+    def iris_sizes(eye_frame: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+        """Calculate the iris size for several binarization thresholds at once.
+
+        The frame is filtered and eroded once, then a cumulative histogram gives
+        the number of pixels at or below every threshold, which are exactly the
+        pixels that `cv2.THRESH_BINARY` turns black.
+
+        Arguments:
+            eye_frame (numpy.ndarray): Frame of the eye to be analyzed
+            thresholds (numpy.ndarray): Threshold values to evaluate
+        """
+        processed_frame = Pupil.smooth(eye_frame)[5:-5, 5:-5]  # Crop the frame to exclude the borders
+        num_pixels = processed_frame.size
+        if num_pixels == 0:
+            raise ValueError("Eye frame is too small to be calibrated.")
+
+        histogram = np.bincount(processed_frame.ravel(), minlength=256)
+        num_blacks = np.cumsum(histogram)[thresholds]  # Number of black pixels per threshold
+        return num_blacks / num_pixels
+
     @staticmethod
     def find_best_threshold(eye_frame: np.ndarray) -> int:
         """Determine the optimal threshold to binarize the eye frame.
@@ -58,19 +174,11 @@ class Calibration:
             eye_frame (numpy.ndarray): Frame of the eye to be analyzed
         """
         average_iris_size = 0.48  # Target iris size ratio
-        trials = {}  # Dictionary to store iris size for each threshold
-
-        for threshold in range(5, 100, 5):  # Test thresholds from 5 to 95
-            try:
-                iris_frame = Pupil.image_processing(eye_frame, threshold)
-                trials[threshold] = Calibration.iris_size(iris_frame)
-            except Exception as e:
-                print(f"Error processing threshold {threshold}: {e}")
-                continue
+        thresholds = np.arange(5, 100, 5)  # Test thresholds from 5 to 95
+        sizes = Calibration.iris_sizes(eye_frame, thresholds)
 
         # Select the threshold with the iris size closest to the target
-        best_threshold, _ = min(trials.items(), key=lambda p: abs(p[1] - average_iris_size))
-        return best_threshold
+        return int(thresholds[np.argmin(np.abs(sizes - average_iris_size))])
 
     def evaluate(self, eye_frame: np.ndarray, side: int, height: float):
         """Improve calibration by evaluating a given eye frame.
@@ -80,6 +188,14 @@ class Calibration:
             side (int): 0 for left eye, 1 for right eye
             height (float): Height of the eye
         """
+        if self._check_lighting:
+            self._check_lighting = False
+            brightness = float(eye_frame.mean())
+            if abs(brightness - self.metadata["brightness"]) > self.lighting_tolerance:
+                logger.warning("Eye brightness %.0f differs from %.0f in the calibration profile, recalibrating",
+                               brightness, self.metadata["brightness"])
+                self._clear()
+
         threshold = self.find_best_threshold(eye_frame)  # Find the best threshold for the eye frame
 
         if side == 0:
@@ -89,4 +205,89 @@ class Calibration:
         else:
             raise ValueError("Invalid value for side. Use 0 for left eye and 1 for right eye.")
 
-        self.eye_heights.append(height)  # Add the eye height to the list
+        self.eye_heights.append(height)  # Add the eye height to the window
+        self.brightness.append(float(eye_frame.mean()))
+
+    def to_dict(self) -> dict:
+        """Return the calibration state as a JSON-serializable profile."""
+        return {
+            "version": PROFILE_VERSION,
+            "nb_frames": self.nb_frames,
+            "thresholds_left": self.thresholds_left.values(),
+            "thresholds_right": self.thresholds_right.values(),
+            "eye_heights": self.eye_heights.values(),
+            "brightness": self.brightness.values(),
+            "metadata": self.metadata,
+        }
+
+    def _clear(self):
+        for window in (self.thresholds_left, self.thresholds_right, self.eye_heights, self.brightness):
+            window.clear()
+        self._frames = [0, 0]
+
+    def reset(self):
+        """Restart the calibration, e.g. before a new video. A loaded profile is restored
+        and its lighting checked again against the next eye frame."""
+        self._clear()
+        if self._profile is None:
+            return
+        for name in ("thresholds_left", "thresholds_right", "eye_heights", "brightness"):
+            window = getattr(self, name)
+            for value in self._profile[name]:
+                window.append(value)
+        self.metadata = dict(self._profile.get("metadata", {}))
+        self._check_lighting = self.metadata.get("brightness") is not None
+
+    @classmethod
+    def from_dict(cls, profile: dict, adapt_interval: int = 0, lighting_tolerance: float = 30.0) -> "Calibration":
+        """Create a calibration from a profile returned by to_dict.
+
+        Arguments:
+            profile (dict): Calibration profile
+            adapt_interval (int): See Calibration
+            lighting_tolerance (float): See Calibration
+        """
+        if profile.get("version") != PROFILE_VERSION:
+            raise ValueError(f"Unsupported calibration profile version: {profile.get('version')}")
+        calibration = cls(profile["nb_frames"], adapt_interval, lighting_tolerance)
+        calibration._profile = profile
+        calibration.reset()
+        return calibration
+
+    def save(self, path: str, **metadata):
+        """Save the calibration profile to a JSON file.
+
+        Arguments:
+            path (str): Profile file
+            metadata: Camera and lighting conditions stored with the profile
+        """
+        self.metadata.update(metadata)
+        self.metadata["saved_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        if len(self.brightness):
+            self.metadata["brightness"] = self.brightness.mean()
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    @classmethod
+    def load(cls, path: str, adapt_interval: int = 0, lighting_tolerance: float = 30.0,
+             **expected) -> "Calibration":
+        """Load a calibration profile from a JSON file. The saved eye-region brightness
+        is compared with the first eye frame analyzed, the calibration restarts if they
+        differ by more than `lighting_tolerance`.
+
+        Arguments:
+            path (str): Profile file
+            adapt_interval (int): See Calibration
+            lighting_tolerance (float): See Calibration
+            expected: Metadata the profile must match, e.g. camera=0, resolution=[640, 480]
+
+        Raises:
+            ValueError: If the profile was saved for other conditions
+        """
+        with open(path) as file:
+            calibration = cls.from_dict(json.load(file), adapt_interval, lighting_tolerance)
+        for key, value in expected.items():
+            if calibration.metadata.get(key) != value:
+                raise ValueError(f"Calibration profile {path} was saved for {key}={calibration.metadata.get(key)!r}, "
+                                 f"not {value!r}")
+        return calibration
@@ -0,0 +1,131 @@
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+def grayscale(frame, out=None):
+    """Returns the luminance of a frame: the frame itself if it is already
+    grayscale, the Y plane of a raw YUYV frame, or the BGR frame converted.
+
+    Arguments:
+        frame (numpy.ndarray): (H, W) gray, (H, W, 2) YUYV or (H, W, 3) BGR frame
+        out (numpy.ndarray): (H, W) uint8 buffer written to, a new array if None
+    """
+    if frame.ndim == 2:
+        if out is None:
+            return frame
+        np.copyto(out, frame)
+        return out
+    if frame.shape[2] == 2:
+        return cv2.extractChannel(frame, 0, dst=out)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=out)
+
+
+class BufferedCapture:
+    """
+    Reads a capture into reused buffers instead of a new array per frame.
+    With gray=True, only the luminance of each frame is kept, for a tracker
+    whose frames are not displayed.
+
+    A frame returned by read() stays untouched until it is handed back with
+    recycle(), so it may be held by any number of stages (e.g. the queues,
+    inference and rendering of a Pipeline). A frame that is never recycled is
+    simply not reused, like the frames of cv2.VideoCapture.
+    """
+
+    def __init__(self, capture, buffers=6, gray=False, width=None, height=None, fourcc=None, fps=None):
+        """
+        Arguments:
+            capture (cv2.VideoCapture): Any object with a read(image=None) -> (ok, frame) method
+                                        that, like cv2.VideoCapture, returns a new frame
+                                        when image is None or does not fit
+            buffers (int): Maximum number of recycled buffers kept for the next reads
+            gray (bool): Serve (H, W) luminance frames instead of BGR frames
+            width (int): Frame width requested from the camera, its default if None
+            height (int): Frame height requested from the camera, its default if None
+            fourcc (str): Pixel format requested from the camera, e.g. "MJPG" or "YUYV".
+                          With gray=True and "YUYV", the raw frames are read and their
+                          Y plane is served, without any color conversion
+            fps (float): Frame rate requested from the camera, its default if None
+        """
+        self.capture = capture
+        self.gray = gray
+        self.raw = False  # True if the camera delivers raw YUYV frames
+        self.buffers = max(1, int(buffers))
+        self.allocated = 0  # Number of frame buffers allocated so far
+
+        if width:
+            capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height:
+            capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            capture.set(cv2.CAP_PROP_FPS, fps)
+        if fourcc:
+            capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+            if gray and fourcc == "YUYV":
+                self.raw = bool(capture.set(cv2.CAP_PROP_CONVERT_RGB, 0))
+
+        self._free = deque()  # Recycled buffers, appended and popped from different threads
+        self._scratch = None  # Color frame read before its luminance is taken
+        self._index = 0
+
+    def _take(self):
+        """Returns a recycled buffer, None if there is none."""
+        try:
+            return self._free.popleft()
+        except IndexError:
+            return None
+
+    def read(self):
+        """Returns (True, frame) like cv2.VideoCapture, with frame a buffer
+        owned by the caller until recycle(), (False, None) at the end of the stream."""
+        buffer = self._take()
+        if not self.gray:
+            ok, frame = self.capture.read(buffer)
+            if not ok:
+                self.recycle(buffer)
+                return False, None
+            if frame is not buffer:  # No recycled buffer, or the frame size changed: read() allocated it
+                self.allocated += 1
+        else:
+            ok, frame = self.capture.read(self._scratch)
+            if not ok:
+                self.recycle(buffer)
+                return False, None
+            self._scratch = frame  # Reused by the next read, reallocated by it if the size changes
+            if self.raw and frame.ndim == 2 and frame.shape[0] == 1:  # Some backends return a flat buffer
+                frame = frame.reshape(int(self.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                                      int(self.get(cv2.CAP_PROP_FRAME_WIDTH)), 2)
+            if buffer is None or buffer.shape != frame.shape[:2]:
+                buffer = np.empty(frame.shape[:2], np.uint8)
+                self.allocated += 1
+            frame = grayscale(frame, buffer)
+        self._index += 1
+        return True, frame
+
+    def recycle(self, frame):
+        """Hands back a frame returned by read(), its buffer is reused by a later read.
+
+        Argument:
+            frame (numpy.ndarray): Frame no longer used by anyone, ignored if None
+        """
+        if frame is not None and len(self._free) < self.buffers:
+            self._free.append(frame)
+
+    @property
+    def served(self):
+        """Number of frames served by the underlying capture, if it counts them."""
+        return getattr(self.capture, "served", self._index)
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def get(self, prop):
+        return self.capture.get(prop)
+
+    def set(self, prop, value):
+        return self.capture.set(prop, value)
+
+    def release(self):
+        self.capture.release()
@@ -0,0 +1,223 @@
+import math
+from collections import deque
+
+import numpy as np
+
+from .direction import DIRECTIONS
+from .pipeline import LatencyMeter
+
+# Every direction determine_eye_direction can return, "Down" included
+CHOICES = DIRECTIONS + ["Down"]
+UNKNOWN = "Unknown"
+
+
+class OneEuroFilter:
+    """
+    One Euro filter of a 2D point: a low-pass filter whose cutoff frequency
+    grows with the speed of the point, so slow jitter is smoothed out while
+    fast movements are followed with little lag.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.05, d_cutoff=1.0):
+        """
+        Arguments:
+            min_cutoff (float): Cutoff frequency in Hz when the point is still,
+                                lower values smooth more
+            beta (float): Cutoff increase per pixel/second of speed, higher values lag less
+            d_cutoff (float): Cutoff frequency in Hz of the speed estimate
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        """Forgets the filtered point, e.g. when the pupil is lost."""
+        self._value = None
+        self._speed = np.zeros(2)
+        self._timestamp = None
+
+    @staticmethod
+    def _alpha(cutoff, elapsed):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / elapsed)
+
+    def filter(self, point, timestamp):
+        """Returns the filtered (x, y) point.
+
+        Arguments:
+            point (tuple): Measured (x, y) point
+            timestamp (float): Time of the measure in seconds, e.g. the capture time
+        """
+        point = np.asarray(point, np.float64)
+        if self._value is None or timestamp <= self._timestamp:
+            self._value = point
+            self._timestamp = timestamp
+            return tuple(point.tolist())
+
+        elapsed = timestamp - self._timestamp
+        speed = (point - self._value) / elapsed
+        self._speed += self._alpha(self.d_cutoff, elapsed) * (speed - self._speed)
+        cutoff = self.min_cutoff + self.beta * float(np.hypot(*self._speed))
+        self._value = self._value + self._alpha(cutoff, elapsed) * (point - self._value)
+        self._timestamp = timestamp
+        return tuple(self._value.tolist())
+
+
+class DecisionEngine:
+    """
+    This class turns the per-frame directions of both eyes into a stable gaze
+    decision, updated on every frame.
+
+    The votes of the last `window` frames are kept in a ring buffer. Each eye
+    votes for its direction with its pupil confidence, so a doubtful eye weighs
+    less than a clear one. Two voting modes are available:
+        "ewma": votes are exponentially weighted, recent frames counting more.
+                It follows new directions the fastest, but noisy eyes make it
+                flip about twice as often as a batch-of-10 majority vote
+        "hysteresis": votes count equally, and the decision only changes once
+                      another direction leads it by `margin`, or once its share
+                      of the votes falls below `hold_support`. It flips a little
+                      more often than a batch-of-10 majority vote, and follows
+                      new directions in half its delay (see benchmarks.decision).
+                      It is the default
+    """
+
+    MODES = ("ewma", "hysteresis")
+
+    def __init__(self, window=6, mode="hysteresis", alpha=0.3, margin=0.2, min_support=0.4, hold_support=0.1):
+        """
+        Arguments:
+            window (int): Number of frames kept in the ring buffer
+            mode (str): Voting mode, one of MODES
+            alpha (float): Weight of the newest frame in "ewma" mode
+            margin (float): Lead over the current decision (share of the votes)
+                            needed to change it in "hysteresis" mode
+            min_support (float): Minimum share of the votes of the window the winning
+                                 direction needs, the decision is "Unknown" below it
+            hold_support (float): Share of the votes the current decision keeps its place
+                                  with in "hysteresis" mode, even below min_support
+        """
+        if mode not in self.MODES:
+            raise ValueError("Invalid decision mode. Use one of: " + ", ".join(self.MODES))
+
+        self.window = window
+        self.mode = mode
+        self.alpha = alpha
+        self.margin = margin
+        self.min_support = min_support
+        self.hold_support = hold_support
+        self.decision = UNKNOWN
+        self.metrics = DecisionMetrics()
+
+        self._votes = np.zeros((window, len(CHOICES)))  # Ring buffer of per-frame votes
+        self._index = 0
+        self._count = 0
+        # Weight of each slot of the ring buffer, indexed by age (0 = newest)
+        self._decay = (1 - alpha) ** np.arange(window) if mode == "ewma" else np.ones(window)
+
+    def reset(self):
+        """Forgets the votes and the decision."""
+        self._votes.fill(0)
+        self._index = 0
+        self._count = 0
+        self.decision = UNKNOWN
+
+    def _scores(self):
+        """Returns the share of the votes of the window for each of CHOICES."""
+        ages = (self._index - 1 - np.arange(self.window)) % self.window
+        weights = self._decay[:self._count]
+        scores = weights @ self._votes[ages[:self._count]]
+        total = weights.sum()
+        return scores / total if total else scores
+
+    def update(self, left, right, left_confidence=1.0, right_confidence=1.0, timestamp=None):
+        """Adds the directions of one frame and returns the new decision.
+
+        Arguments:
+            left (str): Direction of the left eye, None if it was not located
+            right (str): Direction of the right eye, None if it was not located
+            left_confidence (float): Confidence of the left pupil, between 0 and 1
+            right_confidence (float): Confidence of the right pupil, between 0 and 1
+            timestamp (float): Capture time of the frame, from time.perf_counter()
+
+        Returns:
+            str: One of CHOICES, or "Unknown"
+        """
+        votes = self._votes[self._index]
+        votes.fill(0)
+        for direction, confidence in ((left, left_confidence), (right, right_confidence)):
+            if direction in CHOICES:
+                votes[CHOICES.index(direction)] += 0.5 * confidence
+        self._index = (self._index + 1) % self.window
+        self._count = min(self._count + 1, self.window)
+
+        scores = self._scores()
+        best = int(np.argmax(scores))
+        decision = CHOICES[best] if scores[best] >= self.min_support else UNKNOWN
+        if self.mode == "hysteresis" and self.decision in CHOICES and decision != self.decision:
+            current = scores[CHOICES.index(self.decision)]
+            if scores[best] - current < self.margin and current >= self.hold_support:
+                decision = self.decision
+
+        consensus = left if left == right and left in CHOICES else None
+        self.metrics.record(consensus, decision, timestamp)
+        self.decision = decision
+        return decision
+
+
+class DecisionMetrics:
+    """
+    Measures a decision engine: the decision latency, from the first frame both
+    eyes agree on a new direction to the frame the decision follows them, and
+    the flip rate, the number of decision changes per frame.
+    """
+
+    def __init__(self, size=300):
+        self.latency = LatencyMeter(size)  # Milliseconds, for frames with a timestamp
+        self.delays = deque(maxlen=size)  # Same latency in frames
+        self.frames = 0
+        self.flips = 0  # Number of decision changes
+        self._decision = UNKNOWN
+        self._target = None  # Last direction both eyes agreed on
+        self._pending = None  # (frame, timestamp) both eyes first agreed on _target at, until decided
+
+    def record(self, consensus, decision, timestamp=None):
+        """Records the raw consensus and the decision of one frame.
+
+        The latency runs from the first frame both eyes agree on a direction
+        the decision does not follow yet, across frames where a noisy eye
+        breaks the agreement, until the decision follows or the eyes agree on
+        another direction.
+
+        Arguments:
+            consensus (str): Direction both eyes agree on, None if they do not
+            decision (str): Decision of the engine
+            timestamp (float): Capture time of the frame, from time.perf_counter()
+        """
+        if consensus is not None:
+            if consensus != self._target:
+                self._target = consensus
+                self._pending = None
+            if self._pending is None and consensus != self._decision:
+                self._pending = (self.frames, timestamp)
+        if decision != self._decision:
+            self.flips += 1
+            self._decision = decision
+        if self._pending is not None and decision == self._target:
+            frame, start = self._pending
+            self.delays.append(self.frames - frame)
+            if start is not None and timestamp is not None:
+                self.latency.record(start, timestamp)
+            self._pending = None
+        self.frames += 1
+
+    def summary(self):
+        """Returns the flip rate and the decision latency, in frames and in milliseconds."""
+        return {
+            "frames": self.frames,
+            "flips": self.flips,
+            "flip_rate": self.flips / self.frames if self.frames else 0.0,
+            "delay_frames": float(np.mean(self.delays)) if self.delays else None,
+            "latency": self.latency.summary(),
+        }
@@ -0,0 +1,61 @@
+from functools import lru_cache
+
+import numpy as np
+
+from .eye import Eye
+
+# Landmark groups used to score each direction, in the order
+# (right, left, up, down, center) expected by determine_eye_direction
+LEFT_EYE_GROUPS = [[36, 37, 41], [38, 40, 39], [37, 38], [40, 41], [41, 40]]
+RIGHT_EYE_GROUPS = [[42, 43, 47], [46, 44, 45], [43, 44], [46, 47], [46, 47]]
+
+DIRECTIONS = ['Left', 'Right', 'Up', 'Center']
+
+
+@lru_cache(maxsize=None)
+def _scoring_matrix(points, landmarks_ids):
+    """Returns a (4, len(points)) matrix turning the pupil distances of the eye
+    points into the weighted group means scored for each of DIRECTIONS."""
+    right_group, left_group, up_group, down_group, center_group = landmarks_ids
+    groups = [(left_group, 0.9), (right_group, 0.9), (up_group, 1.0), (center_group, 0.72)]
+    matrix = np.zeros((len(groups), len(points)))
+    for row, (group, weight) in enumerate(groups):
+        for point in group:
+            matrix[row, points.index(point)] += weight / len(group)
+    return matrix
+
+
+def determine_eye_direction(points, eye, pupil_coords, pupils_located, calibration, landmarks_ids):
+    """Decides where one eye is looking from the distances between its pupil and landmarks.
+
+    Arguments:
+        points (list): Landmark indexes of the eye
+        eye (Eye): Analyzed eye
+        pupil_coords (tuple): (x, y) position of the pupil in the frame
+        pupils_located (bool): True if both pupils have been located
+        calibration (Calibration): Calibration holding the average eye height
+        landmarks_ids (list): Landmark groups, see LEFT_EYE_GROUPS
+
+    Returns:
+        tuple: (direction, landmark indexes of the winning group or None)
+    """
+    if abs(eye.landmark_bottom[1] - eye.landmark_top[1]) / calibration.get_avg_height() <= 0.6 and pupils_located:
+        return "Down", None
+
+    offsets = eye.landmarks[points] - np.asarray(pupil_coords)
+    distances = np.sqrt((offsets * offsets).sum(axis=1))
+    matrix = _scoring_matrix(tuple(points), tuple(map(tuple, landmarks_ids)))
+    best = int(np.argmin(matrix @ distances))
+    return DIRECTIONS[best], landmarks_ids[best]
+
+
+def gaze_directions(gaze):
+    """Returns the (left, right) eye directions of a refreshed GazeTracking,
+    or (None, None) if the pupils have not been located."""
+    if not gaze.pupils_located:
+        return None, None
+    left, _ = determine_eye_direction(
+        Eye.LEFT_EYE_POINTS, gaze.eye_left, gaze.pupil_left_coords(), True, gaze.calibration, LEFT_EYE_GROUPS)
+    right, _ = determine_eye_direction(
+        Eye.RIGHT_EYE_POINTS, gaze.eye_right, gaze.pupil_right_coords(), True, gaze.calibration, RIGHT_EYE_GROUPS)
+    return left, right
@@ -0,0 +1,203 @@
+import threading
+import time
+from collections import deque
+
+# Byte sent to the vehicle for each gaze direction
+COMMANDS = {
+    "Up": b'F',
+    "Down": b'B',
+    "Right": b'L',
+    "Left": b'R',
+    "Center": b'F',
+    "Stop": b'S',  # Eyes kept closed, see BlinkDetector
+}
+
+
+class SerialTransport:
+    """
+    Sends command bytes over a serial port, e.g. the HC-06 Bluetooth module
+    or the slave side of a pty.
+    """
+
+    def __init__(self, port="/dev/cu.HC-06", baudrate=9600, timeout=1):
+        import serial
+
+        self.port = port
+        self._serial = serial.Serial(port=port, baudrate=baudrate, timeout=timeout)
+
+    def write(self, data):
+        self._serial.write(data)
+
+    def close(self):
+        self._serial.close()
+
+
+class LoopbackTransport:
+    """
+    Keeps the command bytes in memory with the time they were written, as an
+    in-process stand-in for the vehicle.
+    """
+
+    def __init__(self):
+        self.trace = []  # List of (time.perf_counter() seconds, command byte)
+        self.closed = False
+
+    def write(self, data):
+        self.trace.append((time.perf_counter(), bytes(data)))
+
+    def close(self):
+        self.closed = True
+
+
+class CommandDispatcher:
+    """
+    This class sends the vehicle commands from its own thread. It wakes up as
+    soon as the gaze direction changes and only writes a byte on a command
+    transition, plus keep-alive resends of the current command. A command is
+    held for at least its minimum dwell time before the next transition.
+
+    A requested command only stands while it is submitted again: once no
+    direction was submitted for `expiry` seconds (no face, no pupils or an
+    unknown direction), the dispatcher switches to the "Stop" command, or
+    stops sending anything if there is none, so the vehicle never keeps
+    driving on a stale command.
+    """
+
+    def __init__(self, transport, commands=None, keepalive_interval=1.0, min_dwell=0.0, latency=None,
+                 on_send=None, expiry=1.0, trace_size=1000):
+        """
+        Arguments:
+            transport (SerialTransport): Any object with write(bytes) and close() methods
+            commands (dict): Command byte for each direction, COMMANDS if None
+            keepalive_interval (float): Seconds between resends of an unchanged command,
+                                        None to disable keep-alives
+            min_dwell (float or dict): Minimum seconds a command is held before another one
+                                       is sent, either for all commands or per command byte
+            latency (LatencyMeter): Records capture to command latency on transitions
+            on_send (callable): Called with (command, is_transition) after each write
+            expiry (float): Seconds without a submitted direction after which the
+                            command falls back to "Stop", None to keep it until the next one
+            trace_size (int): Number of recent writes kept in `trace`, None to keep them all
+        """
+        self.transport = transport
+        self.commands = dict(COMMANDS if commands is None else commands)
+        self.keepalive_interval = keepalive_interval
+        self.min_dwell = min_dwell
+        self.latency = latency
+        self.on_send = on_send
+        self.expiry = expiry
+        self.current = None  # Last command sent
+        self.sent = 0  # Number of bytes written
+        self.transitions = 0  # Number of command changes written
+        self.trace = deque(maxlen=trace_size)  # Recent (time, command, is_transition) writes
+
+        self._condition = threading.Condition()
+        self._desired = None
+        self._desired_timestamp = None
+        self._submitted_at = None  # Time of the last submit() of a known direction
+        self._changed_at = 0.0
+        self._last_sent = 0.0
+        self._stopped = False
+        self._thread = None
+
+    def _dwell(self, command):
+        """Returns the minimum dwell time of a command in seconds."""
+        if isinstance(self.min_dwell, dict):
+            return self.min_dwell.get(command, 0.0)
+        return self.min_dwell
+
+    def submit(self, direction, timestamp=None):
+        """Requests the command of a gaze direction. Never blocks on the transport.
+
+        Arguments:
+            direction (str): Gaze direction, e.g. "Left"; unknown directions are ignored
+            timestamp (float): Capture time of the frame that decided the direction
+
+        Returns:
+            bool: True if the direction maps to a command
+        """
+        command = self.commands.get(direction)
+        if command is None:
+            return False
+        with self._condition:
+            self._submitted_at = time.perf_counter()
+            if command != self._desired:
+                self._desired = command
+                self._desired_timestamp = timestamp
+                self._condition.notify()
+        return True
+
+    def _next_action(self, now):
+        """Returns (command, is_transition, timestamp, wait) for the loop. When
+        command is None, nothing is due and the loop waits up to `wait` seconds."""
+        wait = None
+
+        stop = self.commands.get("Stop")
+        if self.expiry is not None and self._submitted_at is not None and self._desired != stop:
+            expires = self._submitted_at + self.expiry
+            if now >= expires:
+                # Nothing submitted lately: stop the vehicle, or let its own watchdog do it
+                self._desired = stop
+                self._desired_timestamp = None
+                if stop is None:
+                    self.current = None
+            else:
+                wait = expires - now
+
+        if self._desired is not None and self._desired != self.current:
+            dwell_end = self._changed_at + self._dwell(self.current) if self.current is not None else now
+            if now >= dwell_end:
+                self.current = self._desired
+                self._changed_at = now
+                self._last_sent = now
+                return self.current, True, self._desired_timestamp, None
+            wait = dwell_end - now if wait is None else min(wait, dwell_end - now)
+
+        if self.current is not None and self.keepalive_interval:
+            due = self._last_sent + self.keepalive_interval
+            if now >= due:
+                self._last_sent = now
+                return self.current, False, None, None
+            wait = due - now if wait is None else min(wait, due - now)
+
+        return None, False, None, wait
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                command, is_transition, timestamp, wait = self._next_action(time.perf_counter())
+                if command is None:
+                    self._condition.wait(wait)
+                    continue
+
+            self.transport.write(command)
+            self.sent += 1
+            self.trace.append((time.perf_counter(), command, is_transition))
+            if is_transition:
+                self.transitions += 1
+                if self.latency is not None and timestamp is not None:
+                    self.latency.record(timestamp)
+            if self.on_send is not None:
+                self.on_send(command, is_transition)
+
+    def start(self):
+        """Starts the dispatcher thread."""
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, name="dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, close=True):
+        """Stops the dispatcher thread.
+
+        Argument:
+            close (bool): Also close the transport
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        if close:
+            self.transport.close()
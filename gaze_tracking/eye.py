@@ -1,10 +1,99 @@
+import logging
 import math
+import threading
 
 import cv2
 import numpy as np
 
+from .landmarks import as_landmark_array
+from .profiling import NULL_PROFILER, RateLimitedLog
 from .pupil import Pupil
 
+logger = logging.getLogger(__name__)
+_threshold_log = RateLimitedLog(logger, interval=5.0, level=logging.DEBUG)
+_scratch = threading.local()
+
+
+def isolate_region(frame, region, margin=5):
+    """Returns the bounding box crop of a polygon, with everything outside the polygon
+    set to white, and the (x, y) origin of the crop in the frame.
+
+    Only the bounding box is touched: the mask lives in a scratch buffer that is
+    reused across frames (one per thread), and the box is clamped to the frame.
+
+    Arguments:
+        frame (numpy.ndarray): Grayscale frame containing the face
+        region (numpy.ndarray): (N, 2) int32 polygon points
+        margin (int): Number of pixels kept around the polygon
+    """
+    height, width = frame.shape[:2]
+    min_x = max(int(region[:, 0].min()) - margin, 0)
+    max_x = min(int(region[:, 0].max()) + margin, width)
+    min_y = max(int(region[:, 1].min()) - margin, 0)
+    max_y = min(int(region[:, 1].max()) + margin, height)
+    crop_height = max(max_y - min_y, 0)
+    crop_width = max(max_x - min_x, 0)
+
+    size = crop_height * crop_width
+    buffer = getattr(_scratch, "mask", None)
+    if buffer is None or buffer.size < size:
+        buffer = _scratch.mask = np.empty(max(size, 4096), np.uint8)
+    mask = buffer[:size].reshape(crop_height, crop_width)
+
+    isolated = frame[min_y:max_y, min_x:max_x].copy()
+    if size:
+        mask.fill(255)
+        cv2.fillPoly(mask, [region], 0, offset=(-min_x, -min_y))
+        cv2.bitwise_or(isolated, mask, dst=isolated)
+
+    return isolated, (min_x, min_y)
+
+
+def blinking_ratio(landmarks, points):
+    """Returns the width / height ratio of an eye, with the middle of its top and
+    bottom lids. The ratio grows as the eye closes, and is None for a zero height.
+
+    Arguments:
+        landmarks (numpy.ndarray): (68, 2) facial landmarks for the face region
+        points (list): Points of the eye
+
+    Returns:
+        tuple: (ratio, (x, y) top, (x, y) bottom)
+    """
+    left = landmarks[points[0]].tolist()
+    right = landmarks[points[3]].tolist()
+    top = Eye._middle_point(landmarks[points[1]], landmarks[points[2]])
+    bottom = Eye._middle_point(landmarks[points[5]], landmarks[points[4]])
+
+    eye_width = math.hypot((left[0] - right[0]), (left[1] - right[1]))
+    eye_height = math.hypot((top[0] - bottom[0]), (top[1] - bottom[1]))
+
+    try:
+        ratio = eye_width / eye_height
+    except ZeroDivisionError:
+        ratio = None
+
+    return ratio, top, bottom
+
+
+def locate_pupils(eyes, profiler=None, pupil_engine="contours"):
+    """Locates the pupils of eyes built with batched=True, all in one Pupil.batch().
+    The eyes may come from several faces, closed eyes are left without a pupil.
+
+    Arguments:
+        eyes (list): Eye objects
+        profiler (Profiler): Collects the timings of the stages
+        pupil_engine (str): Pupil localization method, one of Pupil.ENGINES
+    """
+    eyes = [eye for eye in eyes if eye is not None and eye.pupil is None and eye.threshold is not None]
+    if not eyes:
+        return
+    profiler = profiler or NULL_PROFILER
+    with profiler.stage("eye.pupil"):
+        pupils = Pupil.batch([eye.frame for eye in eyes], [eye.threshold for eye in eyes], profiler, pupil_engine)
+    for eye, pupil in zip(eyes, pupils):
+        eye.pupil = pupil
+
 
 class Eye:
     """
@@ -15,29 +104,35 @@ class Eye:
     LEFT_EYE_POINTS = [36, 37, 38, 39, 40, 41]
     RIGHT_EYE_POINTS = [42, 43, 44, 45, 46, 47]
 
-    def __init__(self, original_frame, landmarks, side, calibration):
+    def __init__(self, original_frame, landmarks, side, calibration, profiler=None, pupil_engine="contours",
+                 closed=False, batched=False):
         self.frame = None
         self.origin = None
         self.center = None
         self.pupil = None
         self.landmark_points = None
-        self.landmarks = landmarks
+        self.landmarks = as_landmark_array(landmarks)  # (68, 2) int32 array shared with the tracker
         self.height = None
         self.landmark_bottom = None
         self.landmark_top = None
+        self.profiler = profiler or NULL_PROFILER
+        self.pupil_engine = pupil_engine
+        self.closed = closed  # A closed eye is isolated, but neither calibrated nor searched for a pupil
+        self.batched = batched  # The pupil is left to locate_pupils()
+        self.threshold = None  # Binarization threshold of the pupil search
 
-        self._analyze(original_frame, landmarks, side, calibration)
+        self._analyze(original_frame, self.landmarks, side, calibration)
 
     @staticmethod
     def _middle_point(p1, p2):
         """Returns the midpoint between two points.
 
         Arguments:
-            p1 (dlib.point): First point
-            p2 (dlib.point): Second point
+            p1 (numpy.ndarray): First (x, y) point
+            p2 (numpy.ndarray): Second (x, y) point
         """
-        x = int((p1.x + p2.x) / 2)
-        y = int((p1.y + p2.y) / 2)
+        x = int((int(p1[0]) + int(p2[0])) / 2)
+        y = int((int(p1[1]) + int(p2[1])) / 2)
         return (x, y)
 
     def _isolate(self, frame, landmarks, points):
@@ -45,26 +140,12 @@ class Eye:
 
         Arguments:
             frame (numpy.ndarray): Frame containing the face
-            landmarks (dlib.full_object_detection): Facial landmarks for the face region
+            landmarks (numpy.ndarray): (68, 2) facial landmarks for the face region
             points (list): Points of the eye
         """
-        region = np.array([(landmarks.part(point).x, landmarks.part(point).y) for point in points]).astype(np.int32)
+        region = landmarks[points]
         self.landmark_points = region
-
-        height, width = frame.shape[:2]
-        black_frame = np.zeros((height, width), np.uint8)
-        mask = np.full((height, width), 255, np.uint8)
-        cv2.fillPoly(mask, [region], (0, 0, 0))
-        eye = cv2.bitwise_not(black_frame, frame.copy(), mask=mask)
-
-        margin = 5
-        min_x = np.min(region[:, 0]) - margin
-        max_x = np.max(region[:, 0]) + margin
-        min_y = np.min(region[:, 1]) - margin
-        max_y = np.max(region[:, 1]) + margin
-
-        self.frame = eye[min_y:max_y, min_x:max_x]
-        self.origin = (min_x, min_y)
+        self.frame, self.origin = isolate_region(frame, region)
 
         height, width = self.frame.shape[:2]
         self.center = (width / 2, height / 2)
@@ -74,27 +155,13 @@ class Eye:
         """Calculates the blinking ratio to determine if the eye is closed.
 
         Arguments:
-            landmarks (dlib.full_object_detection): Facial landmarks for the face region
+            landmarks (numpy.ndarray): (68, 2) facial landmarks for the face region
             points (list): Points of the eye
 
         Returns:
             float: The blinking ratio
         """
-        left = (landmarks.part(points[0]).x, landmarks.part(points[0]).y)
-        right = (landmarks.part(points[3]).x, landmarks.part(points[3]).y)
-        top = self._middle_point(landmarks.part(points[1]), landmarks.part(points[2]))
-        bottom = self._middle_point(landmarks.part(points[5]), landmarks.part(points[4]))
-        self.landmark_bottom = bottom
-        self.landmark_top = top
-
-        eye_width = math.hypot((left[0] - right[0]), (left[1] - right[1]))
-        eye_height = math.hypot((top[0] - bottom[0]), (top[1] - bottom[1]))
-
-        try:
-            ratio = eye_width / eye_height
-        except ZeroDivisionError:
-            ratio = None
-
+        ratio, self.landmark_top, self.landmark_bottom = blinking_ratio(landmarks, points)
         return ratio
 
     def _analyze(self, original_frame, landmarks, side, calibration):
@@ -102,7 +169,7 @@ class Eye:
 
         Arguments:
             original_frame (numpy.ndarray): Frame passed by the user
-            landmarks (dlib.full_object_detection): Facial landmarks for the face region
+            landmarks (numpy.ndarray): (68, 2) facial landmarks for the face region
             side (int): 0 for left eye, 1 for right eye
             calibration (Calibration): Calibration object managing binarization threshold
         """
@@ -113,13 +180,21 @@ class Eye:
         else:
             return
 
-        self.blinking = self._blinking_ratio(landmarks, points)
-        self._isolate(original_frame, landmarks, points)
+        with self.profiler.stage("eye.isolate"):
+            self.blinking = self._blinking_ratio(landmarks, points)
+            self._isolate(original_frame, landmarks, points)
 
-        if not calibration.is_complete():
-            eye_height = abs(self.landmark_top[1] - self.landmark_bottom[1])
-            calibration.evaluate(self.frame, side, eye_height)
+        if self.closed:
+            return
 
-        threshold = calibration.threshold(side)
-        print("CALIBRATION THRESHOLD:", threshold)
-        self.pupil = Pupil(self.frame, threshold)
+        if calibration.needs_evaluation(side):
+            with self.profiler.stage("eye.calibration"):
+                eye_height = abs(self.landmark_top[1] - self.landmark_bottom[1])
+                calibration.evaluate(self.frame, side, eye_height)
+
+        threshold = self.threshold = calibration.threshold(side)
+        _threshold_log.log(side, "calibration threshold of side %d: %d", side, threshold)
+        if self.batched:
+            return
+        with self.profiler.stage("eye.pupil"):
+            self.pupil = Pupil(self.frame, threshold, self.profiler, self.pupil_engine)
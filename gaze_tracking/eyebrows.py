@@ -1,6 +1,7 @@
-import numpy as np
-import cv2
+import time
 
+from .eye import isolate_region
+from .landmarks import as_landmark_array
 
 
 class EyeBrow:
@@ -18,18 +19,18 @@ class EyeBrow:
         self.pupil = None
         self.landmark_points = None
 
-        self._analyze(original_frame, landmarks, side, calibration)
+        self._analyze(original_frame, as_landmark_array(landmarks), side, calibration)
 
     @staticmethod
     def _middle_point(p1, p2):
         """Returns the midpoint between two points.
 
         Arguments:
-            p1 (dlib.point): First point
-            p2 (dlib.point): Second point
+            p1 (numpy.ndarray): First (x, y) point
+            p2 (numpy.ndarray): Second (x, y) point
         """
-        x = int((p1.x + p2.x) / 2)
-        y = int((p1.y + p2.y) / 2)
+        x = int((int(p1[0]) + int(p2[0])) / 2)
+        y = int((int(p1[1]) + int(p2[1])) / 2)
         return (x, y)
 
     def _isolate(self, frame, landmarks, points):
@@ -37,26 +38,12 @@ class EyeBrow:
 
         Arguments:
             frame (numpy.ndarray): Frame containing the face
-            landmarks (dlib.full_object_detection): Facial landmarks for the face region
+            landmarks (numpy.ndarray): (68, 2) facial landmarks for the face region
             points (list): Points of the eyebrow
         """
-        region = np.array([(landmarks.part(point).x, landmarks.part(point).y) for point in points]).astype(np.int32)
+        region = landmarks[points]
         self.landmark_points = region
-
-        height, width = frame.shape[:2]
-        black_frame = np.zeros((height, width), np.uint8)
-        mask = np.full((height, width), 255, np.uint8)
-        cv2.fillPoly(mask, [region], (0, 0, 0))
-        brow = cv2.bitwise_not(black_frame, frame.copy(), mask=mask)
-
-        margin = 5
-        min_x = np.min(region[:, 0]) - margin
-        max_x = np.max(region[:, 0]) + margin
-        min_y = np.min(region[:, 1]) - margin
-        max_y = np.max(region[:, 1]) + margin
-
-        self.frame = brow[min_y:max_y, min_x:max_x]
-        self.origin = (min_x, min_y)
+        self.frame, self.origin = isolate_region(frame, region)
 
         height, width = self.frame.shape[:2]
         self.center = (width / 2, height / 2)
@@ -66,7 +53,7 @@ class EyeBrow:
 
         Arguments:
             original_frame (numpy.ndarray): Frame passed by the user
-            landmarks (dlib.full_object_detection): Facial landmarks for the face region
+            landmarks (numpy.ndarray): (68, 2) facial landmarks for the face region
             side (int): Indicates whether it's the left eyebrow (0) or the right eyebrow (1)
             calibration (Calibration): Manages the binarization threshold value
         """
@@ -82,3 +69,115 @@ class EyeBrow:
         # if not calibration.is_complete():
         #     calibration.evaluate(self.frame, side)
 
+
+
+def brow_height(landmarks):
+    """Returns the mean height of both eyebrows above the upper eyelids, relative to
+    the eye widths, so it does not change with the distance to the camera.
+
+    Argument:
+        landmarks (numpy.ndarray): (68, 2) facial landmarks for the face region
+    """
+    heights = []
+    for brow, lid, corners in ((EyeBrow.LEFT_BROW_POINTS, [37, 38], (36, 39)),
+                               (EyeBrow.RIGHT_BROW_POINTS, [43, 44], (42, 45))):
+        width = abs(int(landmarks[corners[1]][0]) - int(landmarks[corners[0]][0]))
+        if not width:
+            return None
+        heights.append((landmarks[lid, 1].mean() - landmarks[brow, 1].mean()) / width)
+    return float(sum(heights) / 2)
+
+
+class BrowEvent:
+    """
+    A brow raise held for at least min_duration seconds.
+    """
+
+    __slots__ = ("kind", "start", "duration")
+
+    def __init__(self, kind, start, duration):
+        self.kind = kind  # "raise"
+        self.start = start  # Time the brows went up, from time.perf_counter()
+        self.duration = duration  # Seconds the brows had been up when the event was raised
+
+    def __repr__(self):
+        return f"BrowEvent({self.kind!r}, duration={self.duration:.3f} s)"
+
+
+class BrowRaiseDetector:
+    """
+    This class turns the brow height (see brow_height) into a raise gesture.
+    The resting height is learned over the first frames and then follows slow
+    changes while the brows are down. The brows are up once the height exceeds
+    the resting one by raise_ratio, and down again below lower_ratio, so a
+    height hovering around one threshold does not flicker.
+    """
+
+    def __init__(self, raise_ratio=0.15, lower_ratio=0.07, min_duration=0.15, warm_up=15, alpha=0.02):
+        """
+        Arguments:
+            raise_ratio (float): Relative height above the resting one at which the brows are up
+            lower_ratio (float): Relative height above the resting one below which they are down
+            min_duration (float): Seconds the brows must stay up to raise an event
+            warm_up (int): Number of frames averaged into the resting height before any gesture
+            alpha (float): Weight of each new frame in the resting height afterwards
+        """
+        self.raise_ratio = raise_ratio
+        self.lower_ratio = lower_ratio
+        self.min_duration = min_duration
+        self.warm_up = warm_up
+        self.alpha = alpha
+        self.rest = None  # Resting brow height
+        self.up = False  # The brows are above the raise threshold
+        self.raised = False  # The brows have been up for at least min_duration
+        self.raises = 0  # Number of raise gestures so far
+
+        self._frames = 0
+        self._up_since = None
+
+    def reset(self):
+        """Forgets the resting height, e.g. for a new face."""
+        self.rest = None
+        self.up = False
+        self.raised = False
+        self._frames = 0
+        self._up_since = None
+
+    def update(self, height, timestamp=None):
+        """Updates the state with the brow height of a new frame.
+
+        Arguments:
+            height (float): Brow height of the frame, None if unknown (the state is kept)
+            timestamp (float): Time of the frame, time.perf_counter() if None
+
+        Returns:
+            list: BrowEvent raised by this frame
+        """
+        if height is None:
+            return []
+        if timestamp is None:
+            timestamp = time.perf_counter()
+
+        if self._frames < self.warm_up:
+            self._frames += 1
+            self.rest = height if self.rest is None else self.rest + (height - self.rest) / self._frames
+            return []
+
+        relative = height / self.rest - 1 if self.rest > 0 else 0.0
+        if not self.up:
+            if relative > self.raise_ratio:
+                self.up = True
+                self._up_since = timestamp
+            else:
+                self.rest += self.alpha * (height - self.rest)
+            return []
+
+        if relative < self.lower_ratio:
+            self.up = False
+            self.raised = False
+            return []
+        if not self.raised and timestamp - self._up_since >= self.min_duration:
+            self.raised = True
+            self.raises += 1
+            return [BrowEvent("raise", self._up_since, timestamp - self._up_since)]
+        return []
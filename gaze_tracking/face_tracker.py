@@ -0,0 +1,207 @@
+import time
+
+import cv2
+import dlib
+
+from . import models
+from .landmarks import shape_to_array
+
+
+class FaceTracker:
+    """
+    This class locates the face from frame to frame. The HOG face detector
+    runs once, then the face is followed either from the previous frame's
+    landmarks or with a correlation tracker. A full detection happens again
+    every `redetect_interval` frames or when the tracking confidence drops.
+    """
+
+    MODES = ("detect", "landmarks", "correlation")
+
+    def __init__(self, detector=None, mode="landmarks", redetect_interval=30, min_overlap=0.5, min_psr=7.0,
+                 detection_scale=1.0, detection_upsample=0):
+        """
+        Arguments:
+            detector (dlib.fhog_object_detector): Full-frame face detector, the detector of
+                                                  the calling thread (models.face_detector) if None
+            mode (str): "detect" runs the detector on every frame, "landmarks" seeds the
+                        face rectangle from the previous landmarks, "correlation" follows it
+                        with a dlib correlation tracker
+            redetect_interval (int): Maximum number of frames between two full detections
+            min_overlap (float): Minimum overlap between the seeded rectangle and the one
+                                 implied by the new landmarks ("landmarks" mode)
+            min_psr (float): Minimum peak-to-sidelobe ratio of the correlation tracker
+                             ("correlation" mode)
+            detection_scale (float): The detector runs on the frame resized by this factor,
+                                     the face rectangle is mapped back to full resolution
+            detection_upsample (int): Number of times the detector upsamples the image,
+                                      to find faces that are small after downscaling
+        """
+        if mode not in self.MODES:
+            raise ValueError("Invalid tracking mode. Use one of: " + ", ".join(self.MODES))
+        if not 0 < detection_scale <= 1:
+            raise ValueError("Invalid detection scale. Use a value in (0, 1].")
+
+        self.mode = mode
+        self.redetect_interval = max(1, int(redetect_interval))
+        self.min_overlap = min_overlap
+        self.min_psr = min_psr
+        self.detection_scale = detection_scale
+        self.detection_upsample = detection_upsample
+        self.confidence = None  # Confidence of the last tracked frame
+        self.detected = False  # True if the last face came from a full detection
+        self.timings = {}  # Milliseconds spent per step on the last frame
+
+        self._detector = detector
+        self._correlation = None
+        self._face = None
+        self._frames_since_detection = 0
+        self._rect_offsets = None  # Face rectangle relative to the landmark bounding box
+
+    def reset(self):
+        """Forgets the tracked face so the next frame runs a full detection."""
+        self._face = None
+        self._correlation = None
+        self._rect_offsets = None
+        self.confidence = None
+
+    @staticmethod
+    def _landmark_box(landmarks):
+        """Returns the (left, top, right, bottom) bounding box of the landmarks.
+
+        Argument:
+            landmarks (numpy.ndarray): (68, 2) facial landmarks for the face region
+        """
+        left, top = landmarks.min(axis=0).tolist()
+        right, bottom = landmarks.max(axis=0).tolist()
+        return left, top, right, bottom
+
+    @staticmethod
+    def _overlap(a, b):
+        """Returns the intersection over union of two dlib rectangles."""
+        inter = a.intersect(b)
+        if inter.is_empty():
+            return 0.0
+        inter_area = inter.width() * inter.height()
+        union = a.width() * a.height() + b.width() * b.height() - inter_area
+        return inter_area / union if union else 0.0
+
+    def _remember(self, face, landmarks):
+        """Stores how the face rectangle sits around its landmarks, so later
+        rectangles can be rebuilt from landmarks alone."""
+        left, top, right, bottom = self._landmark_box(landmarks)
+        width = max(right - left, 1)
+        height = max(bottom - top, 1)
+        self._rect_offsets = (
+            (face.left() - left) / width,
+            (face.top() - top) / height,
+            (face.right() - right) / width,
+            (face.bottom() - bottom) / height,
+        )
+
+    def _rect_from_landmarks(self, landmarks):
+        """Rebuilds a detector-like face rectangle around the given landmarks."""
+        left, top, right, bottom = self._landmark_box(landmarks)
+        width = max(right - left, 1)
+        height = max(bottom - top, 1)
+        dl, dt, dr, db = self._rect_offsets
+        return dlib.rectangle(
+            int(round(left + dl * width)),
+            int(round(top + dt * height)),
+            int(round(right + dr * width)),
+            int(round(bottom + db * height)),
+        )
+
+    def detect(self, gray_frame):
+        """Runs the detector on the whole (possibly downscaled) frame.
+
+        Argument:
+            gray_frame (numpy.ndarray): Full resolution grayscale frame
+
+        Returns:
+            list: dlib.rectangle of every face, in full resolution coordinates
+        """
+        detector = self._detector or models.face_detector()
+        scale = self.detection_scale
+        if scale == 1:
+            return list(detector(gray_frame, self.detection_upsample))
+
+        small_frame = cv2.resize(gray_frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return [dlib.rectangle(int(round(face.left() / scale)), int(round(face.top() / scale)),
+                               int(round(face.right() / scale)), int(round(face.bottom() / scale)))
+                for face in detector(small_frame, self.detection_upsample)]
+
+    def _detect(self, gray_frame):
+        """Runs the full-frame detector and returns the first face, or None."""
+        start = time.perf_counter()
+        faces = self.detect(gray_frame)
+        self.timings["detect"] = (time.perf_counter() - start) * 1000
+        self._frames_since_detection = 0
+        self.detected = True
+        return faces[0] if faces else None
+
+    def _seed(self, gray_frame):
+        """Returns the face rectangle predicted from the previous frame, or None
+        when a full detection is due."""
+        if self.mode == "detect" or self._face is None:
+            return None
+        if self._frames_since_detection >= self.redetect_interval:
+            return None
+
+        start = time.perf_counter()
+        if self.mode == "correlation":
+            self.confidence = self._correlation.update(gray_frame)
+            position = self._correlation.get_position()
+            face = dlib.rectangle(
+                int(round(position.left())), int(round(position.top())),
+                int(round(position.right())), int(round(position.bottom())))
+            if self.confidence < self.min_psr:
+                face = None
+        else:
+            face = self._face
+        self.timings["track"] = (time.perf_counter() - start) * 1000
+        return face
+
+    def track(self, gray_frame, predictor):
+        """Locates the face and predicts its landmarks.
+
+        Arguments:
+            gray_frame (numpy.ndarray): Grayscale frame
+            predictor (dlib.shape_predictor): 68-point landmarks predictor
+
+        Returns:
+            tuple: (dlib.rectangle, (68, 2) int32 landmarks array), or (None, None) if no face
+        """
+        self.timings = {}
+        self.detected = False
+        self._frames_since_detection += 1
+
+        face = self._seed(gray_frame)
+        if face is not None:
+            start = time.perf_counter()
+            landmarks = shape_to_array(predictor(gray_frame, face))
+            self.timings["landmarks"] = (time.perf_counter() - start) * 1000
+            if self.mode == "landmarks":
+                self.confidence = self._overlap(face, self._rect_from_landmarks(landmarks))
+                if self.confidence < self.min_overlap:
+                    face = None
+
+        if face is None:
+            face = self._detect(gray_frame)
+            if face is None:
+                self.reset()
+                return None, None
+            start = time.perf_counter()
+            landmarks = shape_to_array(predictor(gray_frame, face))
+            self.timings["landmarks"] = (time.perf_counter() - start) * 1000
+            self._remember(face, landmarks)
+            if self.mode == "correlation":
+                self._correlation = dlib.correlation_tracker()
+                self._correlation.start_track(gray_frame, face)
+
+        if self.mode == "landmarks":
+            # The next frame is seeded from where this frame's landmarks are
+            self._face = self._rect_from_landmarks(landmarks)
+        else:
+            self._face = face
+
+        return face, landmarks
@@ -1,135 +1,346 @@
 from __future__ import division
+import time
 import cv2
-import dlib
-from .eye import Eye
+import numpy as np
+from . import models
+from .blink import BlinkDetector
+from .eye import Eye, blinking_ratio, locate_pupils
 from .calibration import Calibration
-from .eyebrows import EyeBrow
+from .capture import grayscale
+from .eyebrows import BrowRaiseDetector, EyeBrow, brow_height
+from .face_tracker import FaceTracker
+from .landmarks import shape_to_array
+from .profiling import NULL_PROFILER
+from .result import GazeResult
 
 class GazeTracking:
     """
     This class tracks the user's gaze, providing information about the position of the eyes
     and pupils, and whether the eyes are open or closed.
+
+    Optional per-frame signals are chosen with `features`, among FEATURES:
+        "blink": follows the closure of the eyes, and skips the pupil search while they are closed
+        "brow_raise": detects brow raise gestures from the landmarks
+    The eyebrow regions, the annotated frame and the face rectangle are only
+    computed when asked for.
     """
 
-    def __init__(self):
+    FEATURES = ("blink", "brow_raise")
+
+    def __init__(self, tracking_mode="detect", redetect_interval=30, profiler=None, detection_scale=1.0,
+                 detection_upsample=0, model_path=models.DEFAULT_MODEL_PATH, calibration=None,
+                 pupil_engine="contours", adaptive_roi=None, blink_detector=None,
+                 batch_eyes=False, features=("blink",), brow_detector=None):
+        """
+        Arguments:
+            tracking_mode (str): "detect" runs the face detector on every frame,
+                                 "landmarks" or "correlation" follow the face between
+                                 detections (see FaceTracker)
+            redetect_interval (int): Maximum number of frames between two full detections
+            profiler (Profiler): Collects per-stage timings and failure counters,
+                                 instrumentation is disabled if None
+            detection_scale (float): Resize factor of the frame given to the face detector,
+                                     landmarks and eyes always use the full resolution
+            detection_upsample (int): Number of upsamplings done by the face detector
+            model_path (str): Path of the 68-point landmarks model, loaded once per process
+                              on the first frame (see models.warm_up to load it earlier)
+            calibration (Calibration): Calibration to start from, e.g. a loaded profile
+            pupil_engine (str): Pupil localization method, one of Pupil.ENGINES
+            adaptive_roi (AdaptiveROI): Reuses the previous landmarks while the head is stable,
+                                        landmarks are predicted on every frame if None
+            blink_detector (BlinkDetector): Follows the closure of the eyes, a default one if None.
+                                            Pupils are not searched for while the eyes are closed
+            batch_eyes (bool): Smooth and binarize both eye frames in one Pupil.batch() call
+            features (iterable): Optional signals computed on every frame, among FEATURES
+            brow_detector (BrowRaiseDetector): Detects the brow raises, a default one if None
+        """
+        unknown = set(features) - set(self.FEATURES)
+        if unknown:
+            raise ValueError("Invalid feature. Use any of: " + ", ".join(self.FEATURES))
+
         self.frame = None
+        self.face = None
+        self.landmarks = None  # (68, 2) int32 landmarks of the last frame
         self.eye_left = None
         self.eye_right = None
-        self.brow_left = None
-        self.brow_right = None
-        self.calibration = Calibration()
+        self.calibration = calibration or Calibration()
+        self.timings = {}  # Milliseconds spent per step on the last frame
+        self.profiler = profiler or NULL_PROFILER
+        self.pupil_engine = pupil_engine
+        self.adaptive_roi = adaptive_roi
+        self.blink = blink_detector or BlinkDetector()
+        self.batch_eyes = batch_eyes
+        self.blink_events = []  # BlinkEvent raised by the last frame
+        self.features = frozenset(features)
+        self.brows = brow_detector or BrowRaiseDetector()
+        self.brow_events = []  # BrowEvent raised by the last frame
+        self.result = GazeResult(time.perf_counter())  # Results of the last frame
+        self._gray = None  # Grayscale buffer of the BGR frames
+        self._start = None  # Start of an analysis waiting for finish_face()
+        self._gray_frame = None  # Grayscale frame of the last analysis, for the lazy features
+        self._brows = [None, None]  # EyeBrow objects, built on first access
 
-        # Initialize the face detector and facial landmarks predictor
-        self._face_detector = dlib.get_frontal_face_detector()
-        model_path = "shape_predictor_68_face_landmarks.dat"
-        self._predictor = dlib.shape_predictor(model_path)
+        # The landmarks predictor is shared by every instance and loaded on first use,
+        # the face detector is the one of the thread running refresh() (see models)
+        self.model_path = model_path
+        self._model = None
+        self._face_tracker = FaceTracker(None, tracking_mode, redetect_interval,
+                                         detection_scale=detection_scale, detection_upsample=detection_upsample)
+
+    @property
+    def _predictor(self):
+        """The landmarks predictor, loaded (or waited for, see models.warm_up) on first use."""
+        if self._model is None:
+            self._model = models.shape_predictor(self.model_path)
+        return self._model
+
+    def _brow(self, side):
+        """Returns the EyeBrow of a side of the last frame, built on first access."""
+        if self.face is None:
+            return None
+        if self._brows[side] is None:
+            self._brows[side] = EyeBrow(self._gray_frame, self.landmarks, side, self.calibration)
+        return self._brows[side]
+
+    @property
+    def brow_left(self):
+        """EyeBrow of the left side, built on first access. Valid until the next refresh."""
+        return self._brow(0)
+
+    @property
+    def brow_right(self):
+        """EyeBrow of the right side, built on first access. Valid until the next refresh."""
+        return self._brow(1)
 
     @property
     def pupils_located(self):
         """Checks if pupils have been located."""
-        try:
-            int(self.eye_left.pupil.x)
-            int(self.eye_left.pupil.y)
-            int(self.eye_right.pupil.x)
-            int(self.eye_right.pupil.y)
-            return True
-        except Exception:
-            return False
-
-    def _analyze(self):
-        """Detects the face and initializes Eye objects."""
-        gray_frame = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY)
-        faces = self._face_detector(gray_frame)
-
-        try:
-            self.face = faces[0]
-            landmarks = self._predictor(gray_frame, faces[0])
-            self.eye_left = Eye(gray_frame, landmarks, 0, self.calibration)
-            self.eye_right = Eye(gray_frame, landmarks, 1, self.calibration)
-            self.brow_left = EyeBrow(gray_frame, landmarks, 0, self.calibration)
-            self.brow_right = EyeBrow(gray_frame, landmarks, 1, self.calibration)
-        except IndexError:
+        return self.result.pupils_located
+
+    def _analyze(self, timestamp):
+        """Locates the face and initializes Eye objects."""
+        profiler = self.profiler
+        start = time.perf_counter()
+        with profiler.stage("gray"):
+            frame = self.frame
+            if frame.ndim == 2:
+                gray_frame = frame
+            else:
+                # Nothing keeps the grayscale frame past the analysis, so its buffer is reused
+                if self._gray is None or self._gray.shape != frame.shape[:2]:
+                    self._gray = np.empty(frame.shape[:2], np.uint8)
+                gray_frame = grayscale(frame, self._gray)
+
+        roi = self.adaptive_roi
+        if roi is not None and self.face is not None and roi.reusable(gray_frame, self._pupil_confidence()):
+            # Stable head: only the pupils are located again, in the previous eye regions
+            self.timings = {"reuse": (time.perf_counter() - start) * 1000}
+            profiler.count("landmarks_reused")
+            self._analyze_face(gray_frame, self.face, self.landmarks, start, timestamp)
+            return
+
+        face, landmarks = self._face_tracker.track(gray_frame, self._predictor)
+        self.timings = dict(self._face_tracker.timings)
+        if roi is not None:
+            roi.update(gray_frame, landmarks)
+        self._analyze_face(gray_frame, face, landmarks, start, timestamp)
+
+    @staticmethod
+    def _blinking_ratio(landmarks):
+        """Returns the mean blinking ratio of both eyes, inf if an eye has a zero height."""
+        ratios = [blinking_ratio(landmarks, points)[0] for points in (Eye.LEFT_EYE_POINTS, Eye.RIGHT_EYE_POINTS)]
+        if None in ratios:
+            return float("inf")
+        return sum(ratios) / 2
+
+    def _pupil_confidence(self):
+        """Returns the lowest pupil confidence of the last frame, 0 if a pupil was not located."""
+        return min(self.result.confidence)
+
+    def analyze_face(self, frame, gray_frame, face, timestamp=None, locate=True):
+        """Analyzes a face located by the caller, e.g. one of several faces found by
+        MultiFaceTracker, without running face detection.
+
+        Arguments:
+            frame (numpy.ndarray): BGR frame containing the face
+            gray_frame (numpy.ndarray): The same frame in grayscale
+            face (dlib.rectangle): Face rectangle
+            timestamp (float): Time of the frame in seconds, time.perf_counter() if None
+            locate (bool): Locate the pupils now. With batch_eyes, False leaves them to one
+                           locate_pupils() call over the eyes of several faces, after which
+                           finish_face() builds the result
+
+        Returns:
+            GazeResult: Results of the face, None if the pupils are left to the caller
+        """
+        start = time.perf_counter()
+        self.frame = frame
+        landmarks = shape_to_array(self._predictor(gray_frame, face))
+        self.timings = {"landmarks": (time.perf_counter() - start) * 1000}
+        if not self._analyze_face(gray_frame, face, landmarks, start, timestamp, locate):
+            return None
+        return self.result
+
+    def _analyze_face(self, gray_frame, face, landmarks, start, timestamp=None, locate=True):
+        """Initializes the Eye objects of a face, updates the enabled features and records the timings.
+        Returns False if the batched pupils are left to the caller (see analyze_face)."""
+        profiler = self.profiler
+        self.face = face
+        self.landmarks = landmarks
+        self._gray_frame = gray_frame
+        self._brows = [None, None]
+        self.blink_events = []
+        self.brow_events = []
+
+        if self.face is None:
             self.eye_left = None
             self.eye_right = None
-            self.brow_left = None
-            self.brow_right = None
+        else:
+            eyes_start = time.perf_counter()
+            closed = False
+            if "blink" in self.features:
+                # Closed eyes skip the pupil search, and stay out of the calibration
+                self.blink_events = self.blink.update(self._blinking_ratio(landmarks), timestamp)
+                closed = self.blink.closed
+            if "brow_raise" in self.features:
+                self.brow_events = self.brows.update(brow_height(landmarks), timestamp)
+            self.eye_left = Eye(gray_frame, landmarks, 0, self.calibration, profiler, self.pupil_engine, closed,
+                                self.batch_eyes)
+            self.eye_right = Eye(gray_frame, landmarks, 1, self.calibration, profiler, self.pupil_engine, closed,
+                                 self.batch_eyes)
+            if self.batch_eyes and locate:
+                locate_pupils([self.eye_left, self.eye_right], profiler, self.pupil_engine)
+            self.timings["eyes"] = (time.perf_counter() - eyes_start) * 1000
+            if self.batch_eyes and not locate:
+                self._start = start
+                return False
+
+        self._finish(start)
+        return True
+
+    def finish_face(self):
+        """Builds the result of a face analyzed with locate=False, once locate_pupils()
+        has run over its eyes.
 
-    def refresh(self, frame):
+        Returns:
+            GazeResult: Results of the face
+        """
+        self._finish(self._start)
+        return self.result
+
+    def _finish(self, start):
+        """Builds the GazeResult of the analyzed face and records the timings."""
+        profiler = self.profiler
+        tracked = self.face is not None
+        self.result = GazeResult.from_eyes(
+            time.perf_counter(), self.face, self.eye_left, self.eye_right,
+            self.blink.closed if tracked and "blink" in self.features else None, self.blink_events,
+            self.brows.raised if tracked and "brow_raise" in self.features else None, self.brow_events)
+        self.timings["total"] = (time.perf_counter() - start) * 1000
+
+        if profiler.enabled:
+            for name, milliseconds in self.timings.items():
+                profiler.record(name, milliseconds)
+            profiler.count("frames")
+            if self.face is None:
+                profiler.count("no_face")
+            elif self.result.blinking:
+                profiler.count("eyes_closed")
+            elif not self.pupils_located:
+                profiler.count("pupils_not_located")
+            profiler.tick()
+
+    def metrics(self):
+        """Returns the per-stage timings and failure counters collected by the profiler."""
+        return self.profiler.snapshot()
+
+    def reset(self):
+        """Forgets the tracked face and restarts calibration, e.g. before a new video.
+        A loaded calibration profile is kept (see Calibration.reset)."""
+        self.calibration.reset()
+        self._face_tracker.reset()
+        self.blink.reset()
+        self.brows.reset()
+        if self.adaptive_roi is not None:
+            self.adaptive_roi.reset()
+
+    def refresh(self, frame, timestamp=None):
         """Updates the frame and analyzes it.
 
         Arguments:
-            frame (numpy.ndarray): The frame to analyze.
+            frame (numpy.ndarray): The frame to analyze, BGR or grayscale (see BufferedCapture).
+                                   It must stay unchanged until the next refresh,
+                                   the lazy eyebrows and annotated_frame() read it
+            timestamp (float): Time of the frame in seconds, e.g. its capture time or its
+                               position in a video. The blink and brow raise durations are
+                               measured with it, time.perf_counter() if None
+
+        Returns:
+            GazeResult: Results of the frame, also kept in `result`
         """
         self.frame = frame
-        self._analyze()
+        self._analyze(timestamp)
+        return self.result
 
     def pupil_left_coords(self):
         """Returns the coordinates of the left pupil."""
-        if self.pupils_located:
-            x = self.eye_left.origin[0] + self.eye_left.pupil.x
-            y = self.eye_left.origin[1] + self.eye_left.pupil.y
-            return (x, y)
+        return self.result.pupil_left
 
     def pupil_right_coords(self):
         """Returns the coordinates of the right pupil."""
-        if self.pupils_located:
-            x = self.eye_right.origin[0] + self.eye_right.pupil.x
-            y = self.eye_right.origin[1] + self.eye_right.pupil.y
-            return (x, y)
+        return self.result.pupil_right
 
     def horizontal_ratio(self):
         """Returns a number between 0.0 and 1.0 indicating horizontal gaze direction."""
-        if self.pupils_located:
-            pupil_left = self.eye_left.pupil.x / (self.eye_left.center[0] * 2 - 10)
-            pupil_right = self.eye_right.pupil.x / (self.eye_right.center[0] * 2 - 10)
-            return (pupil_left + pupil_right) / 2
+        return self.result.horizontal_ratio
 
     def vertical_ratio(self):
         """Returns a number between 0.0 and 1.0 indicating vertical gaze direction."""
-        if self.pupils_located:
-            pupil_left = self.eye_left.pupil.y / (self.eye_left.center[1] * 2 - 10)
-            pupil_right = self.eye_right.pupil.y / (self.eye_right.center[1] * 2 - 10)
-            return (pupil_left + pupil_right) / 2
+        return self.result.vertical_ratio
 
     def is_right(self):
         """Returns True if the user is looking to the right."""
-        if self.pupils_located:
-            return self.horizontal_ratio() <= 0.35
+        return self.result.is_right
 
     def is_left(self):
         """Returns True if the user is looking to the left."""
-        if self.pupils_located:
-            return self.horizontal_ratio() >= 0.65
+        return self.result.is_left
 
     def is_top(self):
         """Returns True if the user is looking to the top."""
-        if self.pupils_located:
-            return self.vertical_ratio() <= 0.35
+        return self.result.is_top
 
     def is_bottom(self):
         """Returns True if the user is looking to the bottom."""
-        if self.pupils_located:
-            return self.vertical_ratio() >= 0.65
+        return self.result.is_bottom
 
     def is_center(self):
         """Returns True if the user is looking to the center."""
-        if self.pupils_located:
-            return not self.is_right() and not self.is_left()
+        return self.result.is_center
 
     def is_blinking(self):
         """Returns True if the user is blinking."""
-        if self.pupils_located:
-            blinking_ratio = (self.eye_left.blinking + self.eye_right.blinking) / 2
-            return blinking_ratio > 3.8
+        return self.result.blinking
 
-    def annotated_frame(self):
-        """Returns the frame with highlighted pupils."""
-        frame = self.frame.copy()
+    def annotated_frame(self, out=None):
+        """Returns the frame with highlighted pupils.
+
+        Argument:
+            out (numpy.ndarray): BGR buffer of the frame's size drawn into, a new frame if None
+        """
+        if self.frame.ndim == 2:
+            frame = cv2.cvtColor(self.frame, cv2.COLOR_GRAY2BGR, dst=out)
+        elif out is not None:
+            np.copyto(out, self.frame)
+            frame = out
+        else:
+            frame = self.frame.copy()
 
-        if self.pupils_located:
+        result = self.result
+        if result.pupils_located:
             color = (0, 255, 0)
-            x_left, y_left = self.pupil_left_coords()
-            x_right, y_right = self.pupil_right_coords()
+            x_left, y_left = result.pupil_left
+            x_right, y_right = result.pupil_right
             cv2.line(frame, (x_left - 5, y_left), (x_left + 5, y_left), color)
             cv2.line(frame, (x_left, y_left - 5), (x_left, y_left + 5), color)
             cv2.line(frame, (x_right - 5, y_right), (x_right + 5, y_right), color)
@@ -0,0 +1,21 @@
+import numpy as np
+
+
+def shape_to_array(shape):
+    """Converts facial landmarks into a (N, 2) int32 array of (x, y) rows, in one pass.
+
+    Argument:
+        shape (dlib.full_object_detection): Landmarks returned by the shape predictor
+    """
+    return np.array([(point.x, point.y) for point in shape.parts()], np.int32)
+
+
+def as_landmark_array(landmarks):
+    """Returns the landmarks as a (N, 2) int32 array, converting dlib shapes once.
+
+    Argument:
+        landmarks (numpy.ndarray or dlib.full_object_detection): Facial landmarks
+    """
+    if isinstance(landmarks, np.ndarray):
+        return landmarks
+    return shape_to_array(landmarks)
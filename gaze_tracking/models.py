@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+
+import dlib
+
+DEFAULT_MODEL_PATH = "shape_predictor_68_face_landmarks.dat"
+MODEL_PATH_VARIABLE = "GAZE_TRACKING_MODEL"  # Environment variable overriding the model path
+MODEL_DIRS = (
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "trained_models"),
+    os.path.join(os.path.expanduser("~"), ".cache", "gaze_tracking"),
+)
+
+_lock = threading.Lock()
+_predictors = {}
+_load_times = {}  # Seconds spent loading each model
+_local = threading.local()
+
+
+def resolve_model_path(model_path=DEFAULT_MODEL_PATH):
+    """Returns the landmarks model file to load. A path to an existing file is
+    used as is. Otherwise the model is looked for in $GAZE_TRACKING_MODEL, then
+    under its file name in the package's trained_models directory and in
+    ~/.cache/gaze_tracking, so the working directory does not matter.
+
+    Argument:
+        model_path (str): Path or file name of the model
+    """
+    if os.path.isfile(model_path):
+        return model_path
+    override = os.environ.get(MODEL_PATH_VARIABLE)
+    if override and os.path.isfile(override):
+        return override
+    for directory in MODEL_DIRS:
+        candidate = os.path.join(directory, os.path.basename(model_path))
+        if os.path.isfile(candidate):
+            return candidate
+    return model_path  # dlib reports the missing file
+
+
+def shape_predictor(model_path=DEFAULT_MODEL_PATH):
+    """Returns the 68-point landmarks predictor of a model file, loading it only
+    once per process. dlib's shape predictor can be shared between threads.
+    A call made while another thread loads the same model waits for it.
+
+    Argument:
+        model_path (str): Path of the shape_predictor_68_face_landmarks.dat model
+    """
+    key = os.path.abspath(resolve_model_path(model_path))
+    predictor = _predictors.get(key)
+    if predictor is None:
+        with _lock:
+            predictor = _predictors.get(key)
+            if predictor is None:
+                start = time.perf_counter()
+                predictor = _predictors[key] = dlib.shape_predictor(key)
+                _load_times[key] = time.perf_counter() - start
+    return predictor
+
+
+def face_detector():
+    """Returns the HOG face detector of the calling thread. A dlib detector
+    must not be used by several threads at once, so each thread builds its own
+    on first use and reuses it afterwards."""
+    detector = getattr(_local, "detector", None)
+    if detector is None:
+        detector = _local.detector = dlib.get_frontal_face_detector()
+    return detector
+
+
+def warm_up(model_path=DEFAULT_MODEL_PATH, background=True):
+    """Loads the landmarks model ahead of the first frame.
+
+    Arguments:
+        model_path (str): Path of the landmarks model
+        background (bool): Load it in a daemon thread and return at once
+
+    Returns:
+        threading.Thread: The loading thread, None if the model was loaded in the calling thread.
+                          Errors are raised again by the first shape_predictor() call.
+    """
+    if not background:
+        shape_predictor(model_path)
+        return None
+
+    def load():
+        try:
+            shape_predictor(model_path)
+        except RuntimeError:
+            pass  # Raised again, with its message, on first use
+
+    thread = threading.Thread(target=load, name="model-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def loaded_models():
+    """Returns the paths of the landmarks models loaded so far."""
+    with _lock:
+        return list(_predictors)
+
+
+def load_times():
+    """Returns the seconds spent loading each landmarks model, by path."""
+    with _lock:
+        return dict(_load_times)
@@ -0,0 +1,128 @@
+from . import models
+from .capture import grayscale
+from .face_tracker import FaceTracker
+from .eye import locate_pupils
+from .gaze_tracking import GazeTracking
+
+
+class FaceTrack:
+    """
+    A face followed across frames. It keeps a stable id and its own
+    GazeTracking, so calibration is kept per face.
+    """
+
+    def __init__(self, face_id, gaze):
+        self.id = face_id
+        self.gaze = gaze
+        self.face = None  # dlib.rectangle of the last frame the face was seen in
+        self.missed = 0  # Number of consecutive frames without the face
+        self.frames = 0  # Number of frames the face was seen in
+
+    @property
+    def visible(self):
+        """Returns True if the face was found in the last frame."""
+        return self.missed == 0
+
+
+class MultiFaceTracker:
+    """
+    This class tracks every face of a frame. Detections are matched to the
+    existing tracks by overlap, so each face keeps the same id (and the same
+    calibration) from frame to frame.
+    """
+
+    def __init__(self, max_faces=4, max_missed=10, min_overlap=0.3, detection_scale=1.0, detection_upsample=0,
+                 model_path=models.DEFAULT_MODEL_PATH, profiler=None, pupil_engine="contours",
+                 batch_eyes=False):
+        """
+        Arguments:
+            max_faces (int): Maximum number of faces analyzed per frame, largest first
+            max_missed (int): Number of frames a face can be missing before its track is dropped
+            min_overlap (float): Minimum overlap between a detection and a track to match them
+            detection_scale (float): Resize factor of the frame given to the face detector
+            detection_upsample (int): Number of upsamplings done by the face detector
+            model_path (str): Path of the 68-point landmarks model, shared by all the faces
+            profiler (Profiler): Shared by the GazeTracking of every face
+            pupil_engine (str): Pupil localization method, one of Pupil.ENGINES
+            batch_eyes (bool): Smooth and binarize the eye frames of all the faces of a frame
+                               in one Pupil.batch() call
+        """
+        self.max_faces = max_faces
+        self.max_missed = max_missed
+        self.min_overlap = min_overlap
+        self.model_path = model_path
+        self.profiler = profiler
+        self.pupil_engine = pupil_engine
+        self.batch_eyes = batch_eyes
+        self.tracks = []
+
+        self._detector = FaceTracker(None, "detect", detection_scale=detection_scale,
+                                     detection_upsample=detection_upsample)
+        self._next_id = 0
+
+    def _new_track(self):
+        track = FaceTrack(self._next_id, GazeTracking(profiler=self.profiler, model_path=self.model_path,
+                                                           pupil_engine=self.pupil_engine,
+                                                           batch_eyes=self.batch_eyes))
+        self._next_id += 1
+        self.tracks.append(track)
+        return track
+
+    def _match(self, faces):
+        """Greedily pairs faces and tracks by decreasing overlap.
+
+        Returns:
+            tuple: (list of (track, face) pairs, list of unmatched faces)
+        """
+        candidates = []
+        for track in self.tracks:
+            for index, face in enumerate(faces):
+                overlap = FaceTracker._overlap(track.face, face)
+                if overlap >= self.min_overlap:
+                    candidates.append((overlap, track.id, index, track))
+        candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+
+        pairs, used_tracks, used_faces = [], set(), set()
+        for _, track_id, index, track in candidates:
+            if track_id in used_tracks or index in used_faces:
+                continue
+            used_tracks.add(track_id)
+            used_faces.add(index)
+            pairs.append((track, faces[index]))
+        return pairs, [face for index, face in enumerate(faces) if index not in used_faces]
+
+    def refresh(self, frame, timestamp=None):
+        """Detects and analyzes every face of a frame.
+
+        Arguments:
+            frame (numpy.ndarray): BGR or grayscale frame
+            timestamp (float): Time of the frame in seconds, time.perf_counter() if None
+
+        Returns:
+            list: FaceTrack of the faces visible in the frame, by id
+        """
+        gray_frame = grayscale(frame)
+        faces = sorted(self._detector.detect(gray_frame), key=lambda f: f.area(), reverse=True)
+        pairs, new_faces = self._match(faces[:self.max_faces])
+        pairs += [(self._new_track(), face) for face in new_faces]
+
+        seen = set()
+        for track, face in pairs:
+            track.gaze.analyze_face(frame, gray_frame, face, timestamp, locate=not self.batch_eyes)
+            track.face = face
+            track.missed = 0
+            track.frames += 1
+            seen.add(track.id)
+        if self.batch_eyes:
+            # One tile for the eyes of every face, then the result of each face
+            eyes = [eye for track, _ in pairs for eye in (track.gaze.eye_left, track.gaze.eye_right)]
+            locate_pupils(eyes, self.profiler, self.pupil_engine)
+            for track, _ in pairs:
+                track.gaze.finish_face()
+
+        for track in self.tracks:
+            if track.id not in seen:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        return sorted((track for track in self.tracks if track.visible), key=lambda t: t.id)
@@ -0,0 +1,209 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class FramePacket:
+    """
+    A captured frame with its sequence number and capture timestamp
+    (time.perf_counter() seconds), carried through every pipeline stage.
+    """
+
+    __slots__ = ("index", "timestamp", "image", "result")
+
+    def __init__(self, index, timestamp, image):
+        self.index = index
+        self.timestamp = timestamp
+        self.image = image
+        self.result = None  # Filled in by the inference stage
+
+
+def _ignore(item):
+    pass
+
+
+class DropOldestQueue:
+    """
+    A bounded queue whose put() never blocks: when the queue is full the
+    oldest item is discarded, so consumers always get the freshest frames.
+    """
+
+    def __init__(self, maxsize=1, on_drop=None):
+        """
+        Arguments:
+            maxsize (int): Capacity of the queue
+            on_drop (callable): Called with each discarded item, outside the lock
+        """
+        self.maxsize = max(1, int(maxsize))
+        self.on_drop = on_drop or _ignore
+        self.dropped = 0  # Number of items discarded so far
+        self._items = deque()
+        self._not_empty = threading.Condition()
+
+    def put(self, item):
+        """Adds an item, discarding the oldest one if the queue is full."""
+        discarded = None
+        with self._not_empty:
+            if len(self._items) >= self.maxsize:
+                discarded = self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._not_empty.notify()
+        if discarded is not None:
+            self.on_drop(discarded)
+
+    def get(self, timeout=None):
+        """Removes and returns the oldest item.
+
+        Argument:
+            timeout (float): Seconds to wait for an item, forever if None
+
+        Raises:
+            queue.Empty: If no item arrived before the timeout
+        """
+        with self._not_empty:
+            if not self._not_empty.wait_for(lambda: self._items, timeout):
+                raise queue.Empty
+            return self._items.popleft()
+
+    def __len__(self):
+        with self._not_empty:
+            return len(self._items)
+
+
+class LatencyMeter:
+    """
+    Keeps the most recent latencies between a capture timestamp and the
+    moment something happened to that frame (e.g. a serial command was sent).
+    """
+
+    def __init__(self, size=300):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.count = 0  # Total number of recorded samples
+
+    def record(self, timestamp, now=None):
+        """Records the latency of a frame captured at `timestamp`.
+
+        Arguments:
+            timestamp (float): Capture time, from time.perf_counter()
+            now (float): Time of the event, time.perf_counter() if None
+        """
+        if now is None:
+            now = time.perf_counter()
+        with self._lock:
+            self._samples.append((now - timestamp) * 1000)
+            self.count += 1
+
+    def summary(self):
+        """Returns a dictionary of latency statistics in milliseconds,
+        over the most recent samples."""
+        with self._lock:
+            samples = np.array(self._samples)
+        if not len(samples):
+            return {"count": self.count}
+        return {
+            "count": self.count,
+            "mean": float(samples.mean()),
+            "p50": float(np.percentile(samples, 50)),
+            "p95": float(np.percentile(samples, 95)),
+            "max": float(samples.max()),
+        }
+
+
+class Pipeline:
+    """
+    This class runs frame capture and inference in their own threads, linked by
+    drop-oldest queues, so a slow inference frame never delays the next capture
+    and the output stage always works on the freshest result.
+
+    The output stage is the caller: it takes analyzed packets from `results`
+    (GUI calls such as cv2.imshow must stay on the main thread), and hands
+    each one back with release() once done with its image. With a capture
+    that recycles its buffers (see BufferedCapture), a frame buffer is only
+    reused after its packet was dropped by a queue or released.
+    """
+
+    def __init__(self, capture, analyze, queue_size=1):
+        """
+        Arguments:
+            capture (cv2.VideoCapture): Any object with a read() -> (ok, frame) method
+            analyze (callable): Called with each FramePacket in the inference thread,
+                                its return value is stored in packet.result
+            queue_size (int): Capacity of each queue between stages
+        """
+        self.capture = capture
+        self.analyze = analyze
+        self.frames = DropOldestQueue(queue_size, self.release)
+        self.results = DropOldestQueue(queue_size, self.release)
+        self.errors = []  # Exceptions raised by the stage threads
+
+        self._stop = threading.Event()
+        self._captured = threading.Event()  # Set once the capture has no more frames
+        self._threads = []
+
+    @property
+    def running(self):
+        """Returns True until the inference stage is done with the last frame."""
+        return bool(self._threads) and self._threads[-1].is_alive()
+
+    def release(self, packet):
+        """Hands the image of a packet back to the capture, for a later read.
+        The image must not be used afterwards."""
+        recycle = getattr(self.capture, "recycle", None)
+        if recycle is not None and packet.image is not None:
+            recycle(packet.image)
+        packet.image = None
+
+    def start(self):
+        """Starts the capture and inference threads."""
+        self._stop.clear()
+        self._captured.clear()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._inference_loop, name="inference", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=2.0):
+        """Stops the stage threads and waits for them to exit."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _capture_loop(self):
+        index = 0
+        try:
+            while not self._stop.is_set():
+                ok, image = self.capture.read()
+                timestamp = time.perf_counter()
+                if not ok:
+                    break
+                self.frames.put(FramePacket(index, timestamp, image))
+                index += 1
+        except Exception as e:
+            self.errors.append(e)
+            self._stop.set()
+        finally:
+            # At the end of a stream, the inference stage still analyzes the queued frames
+            self._captured.set()
+
+    def _inference_loop(self):
+        try:
+            while not self._stop.is_set():
+                try:
+                    packet = self.frames.get(timeout=0.1)
+                except queue.Empty:
+                    if self._captured.is_set():
+                        break
+                    continue
+                packet.result = self.analyze(packet)
+                self.results.put(packet)
+        except Exception as e:
+            self.errors.append(e)
+        finally:
+            self._stop.set()
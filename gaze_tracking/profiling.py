@@ -0,0 +1,243 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_NULL_CONTEXT = nullcontext()
+
+
+class RollingStats:
+    """
+    Keeps the last `size` samples of a stage in a preallocated ring buffer.
+    """
+
+    def __init__(self, size=512):
+        self._samples = np.zeros(size, np.float64)
+        self._index = 0
+        self.count = 0  # Total number of samples ever recorded
+        self.total = 0.0  # Sum of all samples ever recorded
+
+    def add(self, value):
+        self._samples[self._index] = value
+        self._index = (self._index + 1) % len(self._samples)
+        self.count += 1
+        self.total += value
+
+    def window(self):
+        """Returns the samples currently in the ring buffer."""
+        return self._samples[:min(self.count, len(self._samples))]
+
+    def summary(self):
+        """Returns count, mean, p50, p95, p99 and max over the window (milliseconds)."""
+        samples = self.window()
+        if not len(samples):
+            return {"count": 0}
+        p50, p95, p99 = np.percentile(samples, (50, 95, 99))
+        return {
+            "count": self.count,
+            "mean": float(samples.mean()),
+            "p50": float(p50),
+            "p95": float(p95),
+            "p99": float(p99),
+            "max": float(samples.max()),
+        }
+
+
+class _Timer:
+    __slots__ = ("_profiler", "_name", "_start")
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._profiler.record(self._name, (time.perf_counter() - self._start) * 1000)
+        return False
+
+
+class Profiler:
+    """
+    This class collects per-stage timings (rolling windows) and event counters
+    for the gaze pipeline. While disabled, stage() returns a shared no-op
+    context and record()/count() return immediately.
+    """
+
+    def __init__(self, enabled=True, window=512, dump_interval=None, dump_path=None):
+        """
+        Arguments:
+            enabled (bool): Collect metrics
+            window (int): Number of samples kept per stage
+            dump_interval (float): Seconds between two periodic dumps, None to disable them
+            dump_path (str): JSON file written by periodic dumps, log only if None
+        """
+        self.enabled = enabled
+        self.window = window
+        self.dump_interval = dump_interval
+        self.dump_path = dump_path
+        self.stages = {}
+        self.counters = {}
+
+        self._lock = threading.Lock()
+        self._last_dump = time.monotonic()
+
+    def stage(self, name):
+        """Returns a context manager timing the enclosed block as stage `name`."""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _Timer(self, name)
+
+    def record(self, name, milliseconds):
+        """Adds a duration to the rolling window of a stage."""
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = RollingStats(self.window)
+            stats.add(milliseconds)
+
+    def count(self, name, increment=1):
+        """Increments an event counter, e.g. "no_face"."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + increment
+
+    def reset(self):
+        """Discards all the collected metrics."""
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+
+    def snapshot(self):
+        """Returns the current metrics as a JSON-serializable dictionary."""
+        with self._lock:
+            return {
+                "stages": {name: stats.summary() for name, stats in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+
+    def dump(self, path=None):
+        """Logs the metrics and writes them to a JSON file if a path is given."""
+        snapshot = self.snapshot()
+        path = path or self.dump_path
+        if path:
+            with open(path, "w") as file:
+                json.dump(snapshot, file, indent=2)
+        logger.info("gaze metrics: %s", json.dumps(snapshot))
+        return snapshot
+
+    def tick(self):
+        """Dumps the metrics if the dump interval has elapsed. Called once per frame."""
+        if not self.enabled or not self.dump_interval:
+            return
+        now = time.monotonic()
+        if now - self._last_dump >= self.dump_interval:
+            self._last_dump = now
+            self.dump()
+
+    def draw(self, frame, origin=(10, 20), color=(147, 58, 31)):
+        """Draws the p50/p95 of every stage and the counters on a frame."""
+        snapshot = self.snapshot()
+        x, y = origin
+        lines = [f"{name}: p50 {s['p50']:.2f} ms  p95 {s['p95']:.2f} ms"
+                 for name, s in sorted(snapshot["stages"].items()) if s["count"]]
+        lines += [f"{name}: {value}" for name, value in sorted(snapshot["counters"].items())]
+        for line in lines:
+            cv2.putText(frame, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 1)
+            y += 16
+        return frame
+
+
+class RateLimitedLog:
+    """
+    Logs a message at most once per `interval` seconds for each key, for values
+    that change on every frame. The messages skipped in between are counted and
+    reported with the next one. Nothing is formatted while the level is disabled.
+    """
+
+    def __init__(self, logger, interval=1.0, level=logging.INFO):
+        """
+        Arguments:
+            logger (logging.Logger): Logger the messages go to
+            interval (float): Minimum seconds between two messages of a key
+            level (int): Level of the messages, e.g. logging.DEBUG
+        """
+        self.logger = logger
+        self.interval = interval
+        self.level = level
+        self._last = {}
+        self._skipped = {}
+        self._lock = threading.Lock()
+
+    def log(self, key, message, *args):
+        """Logs `message % args` unless a message of `key` was logged less than `interval` seconds ago."""
+        if not self.logger.isEnabledFor(self.level):
+            return
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval:
+                self._skipped[key] = self._skipped.get(key, 0) + 1
+                return
+            self._last[key] = now
+            skipped = self._skipped.pop(key, 0)
+        if skipped:
+            message += " (%d more since the last message)"
+            args += (skipped,)
+        self.logger.log(self.level, message, *args)
+
+
+class StartupReport:
+    """
+    Times the phases of a cold start (imports, camera, serial port, model...)
+    from a reference time, usually the top of the main script.
+    """
+
+    def __init__(self, start=None):
+        """
+        Argument:
+            start (float): Reference time.perf_counter(), now if None
+        """
+        self.start = time.perf_counter() if start is None else start
+        self.phases = {}  # Milliseconds per phase, in the order they ended
+        self._lock = threading.Lock()
+
+    def record(self, name, milliseconds):
+        """Records the duration of a phase."""
+        with self._lock:
+            self.phases[name] = milliseconds
+
+    @contextmanager
+    def phase(self, name):
+        """Context manager timing a phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def mark(self, name):
+        """Records a milestone, e.g. the first analyzed frame, as the time since the start."""
+        self.record(name, (time.perf_counter() - self.start) * 1000)
+
+    def summary(self):
+        with self._lock:
+            return dict(self.phases)
+
+    def log(self):
+        logger.info("startup: %s", ", ".join(f"{name} {ms:.0f} ms" for name, ms in self.summary().items()))
+
+
+# Shared disabled profiler, used when instrumentation is not requested
+NULL_PROFILER = Profiler(enabled=False)
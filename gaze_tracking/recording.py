@@ -0,0 +1,258 @@
+"""
+Compact binary recording of the per-frame telemetry of a session, and its
+memory-mapped replay.
+
+A session file is a small JSON header followed by fixed-width records of
+RECORD_DTYPE, one per analyzed frame: the face rectangle, the 68 landmarks,
+the pupils, the calibration thresholds, the ratios, the decided direction
+and the command byte sent. A record is 347 bytes, about 37 MB per hour at
+30 fps. Records are filled in the tracking thread and written in
+batches by a background thread, the reader maps the file without loading it.
+
+    python -m gaze_tracking.recording session.gzr
+"""
+import argparse
+import json
+import math
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from .decision import CHOICES, UNKNOWN
+
+MAGIC = b"GAZEREC1"
+VERSION = 1
+ALIGNMENT = 64  # Records start at a multiple of this offset
+
+# Direction of a record, stored as its index in this tuple ("" if not decided)
+DIRECTION_CODES = ("",) + tuple(CHOICES) + (UNKNOWN, "Stop")
+
+# Bits of the "flags" field
+FACE = 1
+PUPILS = 2
+BLINKING = 4
+BROWS_RAISED = 8
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),  # time.perf_counter() seconds, see the "clock_offset" metadata
+    ("index", "<u4"),  # Frame index in the capture
+    ("flags", "u1"),
+    ("direction", "u1"),  # Index in DIRECTION_CODES
+    ("command", "S1"),  # Last command byte sent to the vehicle when the frame was recorded, b"" if none
+    ("face", "<i4", (4,)),  # (left, top, right, bottom)
+    ("landmarks", "<i2", (68, 2)),
+    ("pupils", "<f4", (2, 2)),  # (x, y) of the left and right pupils in the frame, NaN if not located
+    ("confidence", "<f4", (2,)),
+    ("thresholds", "<i2", (2,)),  # Binarization thresholds of the left and right eyes, -1 if none
+    ("ratios", "<f4", (4,)),  # Horizontal, vertical, left and right blinking ratios, NaN if unknown
+])
+
+
+def _ratio(value):
+    return math.nan if value is None or math.isinf(value) else value
+
+
+class SessionRecorder:
+    """
+    Appends one record per analyzed frame to a session file. add() only fills
+    a row of a preallocated batch, the batches are written by a background
+    thread once full or `flush_interval` seconds old. When the writer falls
+    behind by more than `buffers` batches, frames are dropped and counted
+    instead of blocking the tracking.
+    """
+
+    def __init__(self, path, metadata=None, batch_size=256, flush_interval=1.0, buffers=8):
+        """
+        Arguments:
+            path (str): Session file, overwritten
+            metadata (dict): JSON serializable values kept in the header, e.g. the camera
+            batch_size (int): Records per write
+            flush_interval (float): Maximum seconds a record waits before being written
+            buffers (int): Number of preallocated batches
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.written = 0  # Number of records written to the file
+        self.dropped = 0  # Number of records dropped because the writer was behind
+
+        metadata = dict(metadata or {})
+        metadata.setdefault("clock_offset", time.time() - time.perf_counter())
+        header = json.dumps({"version": VERSION, "dtype": RECORD_DTYPE.descr, "metadata": metadata}).encode()
+        size = len(MAGIC) + 4 + len(header)
+        header += b" " * (-size % ALIGNMENT)
+
+        self._file = open(path, "wb")
+        self._file.write(MAGIC + len(header).to_bytes(4, "little") + header)
+        self._free = queue.Queue()
+        for _ in range(max(1, int(buffers))):
+            self._free.put(np.zeros(max(1, int(batch_size)), RECORD_DTYPE))
+        self._full = queue.Queue()
+        self._batch = None
+        self._count = 0
+        self._thread = threading.Thread(target=self._loop, name="recorder", daemon=True)
+        self._thread.start()
+
+    def add(self, timestamp, index, gaze, direction=None, command=None):
+        """Records the last frame analyzed by a GazeTracking instance.
+
+        Arguments:
+            timestamp (float): Capture time of the frame, from time.perf_counter()
+            index (int): Frame index in the capture
+            gaze (GazeTracking): Tracker that just analyzed the frame
+            direction (str): Decided direction, one of DIRECTION_CODES
+            command (bytes): Last command byte sent to the vehicle, e.g. CommandDispatcher.current
+        """
+        if self._batch is None:
+            try:
+                self._batch = self._free.get_nowait()
+            except queue.Empty:
+                self.dropped += 1
+                return
+            self._count = 0
+        record = self._batch[self._count]
+        result = gaze.result
+
+        flags = 0
+        if result.face is not None:
+            flags |= FACE
+            record["face"] = result.face
+            record["landmarks"] = gaze.landmarks
+        else:
+            record["face"] = 0
+            record["landmarks"] = 0
+        if result.pupils_located:
+            flags |= PUPILS
+            record["pupils"] = (result.pupil_left, result.pupil_right)
+            record["ratios"][:2] = result.horizontal_ratio, result.vertical_ratio
+        else:
+            record["pupils"] = math.nan
+            record["ratios"][:2] = math.nan
+        if result.blinking:
+            flags |= BLINKING
+        if result.brows_raised:
+            flags |= BROWS_RAISED
+        for side, eye in enumerate((gaze.eye_left, gaze.eye_right)):
+            tracked = result.face is not None and eye is not None
+            threshold = eye.threshold if tracked else None
+            record["thresholds"][side] = -1 if threshold is None else threshold
+            record["ratios"][2 + side] = _ratio(eye.blinking) if tracked else math.nan
+
+        record["timestamp"] = timestamp
+        record["index"] = index
+        record["flags"] = flags
+        record["direction"] = DIRECTION_CODES.index(direction) if direction in DIRECTION_CODES else 0
+        record["command"] = command or b""
+        record["confidence"] = result.confidence
+
+        self._count += 1
+        if self._count == len(self._batch) or timestamp - self._batch[0]["timestamp"] >= self.flush_interval:
+            self._flush()
+
+    def _flush(self):
+        if self._batch is not None and self._count:
+            self._full.put((self._batch, self._count))
+            self._batch = None
+
+    def _loop(self):
+        while True:
+            item = self._full.get()
+            if item is None:
+                return
+            batch, count = item
+            self._file.write(batch[:count].data)
+            self.written += count
+            self._free.put(batch)
+
+    def close(self):
+        """Writes the pending records and closes the file."""
+        self._flush()
+        self._full.put(None)
+        self._thread.join()
+        self._file.close()
+
+
+class SessionReader:
+    """
+    Memory-maps a session file written by SessionRecorder. `records` is a
+    structured array of RECORD_DTYPE, only the pages touched are read, so
+    single frames and columns of multi-hour sessions are accessed without
+    loading the file. A truncated last record, e.g. after a crash, is ignored.
+    """
+
+    def __init__(self, path):
+        """
+        Arguments:
+            path (str): Session file
+        """
+        with open(path, "rb") as file:
+            magic = file.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a session file")
+            length = int.from_bytes(file.read(4), "little")
+            header = json.loads(file.read(length))
+        if header["version"] != VERSION:
+            raise ValueError(f"Unsupported session version {header['version']}")
+
+        self.path = path
+        self.metadata = header["metadata"]
+        self.dtype = np.dtype([tuple(field[:2]) + tuple(tuple(shape) for shape in field[2:])
+                               for field in header["dtype"]])
+        offset = len(MAGIC) + 4 + length
+        count = (os.path.getsize(path) - offset) // self.dtype.itemsize
+        if count > 0:
+            self.records = np.memmap(path, self.dtype, "r", offset, (count,))
+        else:
+            self.records = np.zeros(0, self.dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, key):
+        return self.records[key]
+
+    def directions(self):
+        """Returns the decided direction of every record, as an array of strings."""
+        return np.array(DIRECTION_CODES)[self.records["direction"]]
+
+    def summary(self):
+        """Returns the frame counts, duration and direction shares of the session."""
+        records = self.records
+        if not len(records):
+            return {"frames": 0}
+        flags = records["flags"]
+        counts = np.bincount(records["direction"], minlength=len(DIRECTION_CODES))
+        duration = float(records["timestamp"][-1] - records["timestamp"][0])
+        return {
+            "frames": len(records),
+            "duration_s": duration,
+            "fps": (len(records) - 1) / duration if duration > 0 else None,
+            "face": float(np.mean(flags & FACE > 0)),
+            "pupils": float(np.mean(flags & PUPILS > 0)),
+            "blinking": float(np.mean(flags & BLINKING > 0)),
+            "brows_raised": float(np.mean(flags & BROWS_RAISED > 0)),
+            "directions": {name or "none": int(count) for name, count in zip(DIRECTION_CODES, counts) if count},
+        }
+
+    def close(self):
+        """Unmaps the file."""
+        mmap = getattr(self.records, "_mmap", None)
+        self.records = np.zeros(0, self.dtype)
+        if mmap is not None:
+            mmap.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("session", help="Session file written with main.py --session")
+    args = parser.parse_args()
+
+    reader = SessionReader(args.session)
+    print(json.dumps({"metadata": reader.metadata, "summary": reader.summary()}, indent=2))
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+FONT_COLOR = (147, 58, 31)
+
+
+class Overlay:
+    """
+    What to draw over a frame. The inference thread only collects these few
+    coordinates and labels, the drawing is left to a Renderer, which may skip
+    the frame or not exist at all.
+    """
+
+    __slots__ = ("pupils", "points", "highlights", "face", "labels")
+
+    def __init__(self):
+        self.pupils = []  # (x, y) pupil centers, drawn as green crosses
+        self.points = []  # (x, y) landmarks, drawn as red dots
+        self.highlights = []  # (x, y) landmarks, drawn as green dots
+        self.face = None  # (left, top, right, bottom) face rectangle
+        self.labels = []  # (text, (x, y), font scale, thickness) labels
+
+    def add_label(self, text, origin, scale=0.5, thickness=1):
+        self.labels.append((text, origin, scale, thickness))
+
+    def draw(self, frame):
+        """Draws the overlay on a frame, in place."""
+        for x, y in self.pupils:
+            x, y = int(x), int(y)
+            cv2.line(frame, (x - 5, y), (x + 5, y), (0, 255, 0))
+            cv2.line(frame, (x, y - 5), (x, y + 5), (0, 255, 0))
+        for point in self.points:
+            cv2.circle(frame, point, 2, (0, 0, 255), cv2.FILLED)
+        for point in self.highlights:
+            cv2.circle(frame, point, 2, (0, 255, 0), cv2.FILLED)
+        if self.face is not None:
+            left, top, right, bottom = self.face
+            cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+        for text, origin, scale, thickness in self.labels:
+            font = cv2.FONT_HERSHEY_DUPLEX if scale > 1 else cv2.FONT_HERSHEY_SIMPLEX
+            cv2.putText(frame, text, origin, font, scale, FONT_COLOR, thickness)
+        return frame
+
+
+class Renderer:
+    """
+    This class draws overlays on a reused buffer and hands the result to its
+    sinks (window, MJPEG stream, video file), at most `max_fps` times per
+    second whatever the inference rate. Frames that are not due are skipped
+    before any copy or drawing is done.
+    """
+
+    def __init__(self, sinks, max_fps=None):
+        """
+        Arguments:
+            sinks (list): Objects with write(frame) and close() methods
+            max_fps (float): Maximum frames rendered per second, unlimited if None
+        """
+        self.sinks = list(sinks)
+        self.max_fps = max_fps
+        self.rendered = 0  # Number of frames drawn
+        self.skipped = 0  # Number of frames skipped by the rate limit
+
+        self._buffer = None
+        self._last = None
+
+    def due(self, now=None):
+        """Returns True if a frame should be rendered at `now` (time.perf_counter())."""
+        if not self.max_fps or self._last is None:
+            return True
+        if now is None:
+            now = time.perf_counter()
+        return now - self._last >= 1.0 / self.max_fps
+
+    def render(self, image, overlay, decorate=None, now=None):
+        """Draws a frame and writes it to every sink, if it is due.
+
+        Arguments:
+            image (numpy.ndarray): BGR or grayscale frame, left untouched
+            overlay (Overlay): What to draw over the frame
+            decorate (callable): Called with the buffer to draw more, e.g. the profiler
+            now (float): Current time.perf_counter(), read if None
+
+        Returns:
+            numpy.ndarray: The rendered buffer, None if the frame was skipped.
+                           It is overwritten by the next render.
+        """
+        if now is None:
+            now = time.perf_counter()
+        if not self.due(now):
+            self.skipped += 1
+            return None
+        self._last = now
+
+        shape = image.shape[:2] + (3,)
+        if self._buffer is None or self._buffer.shape != shape:
+            self._buffer = np.empty(shape, np.uint8)
+        if image.ndim == 2:
+            cv2.cvtColor(image, cv2.COLOR_GRAY2BGR, dst=self._buffer)
+        else:
+            np.copyto(self._buffer, image)
+        overlay.draw(self._buffer)
+        if decorate is not None:
+            decorate(self._buffer)
+        for sink in self.sinks:
+            sink.write(self._buffer)
+        self.rendered += 1
+        return self._buffer
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class WindowSink:
+    """
+    Shows the frames in an OpenCV window. Must be used from the main thread.
+    `closed` turns True once ESC is pressed.
+    """
+
+    def __init__(self, name="Direction"):
+        self.name = name
+        self.closed = False
+
+    def write(self, frame):
+        cv2.imshow(self.name, frame)
+
+    def poll(self):
+        """Processes the window events, returns False once ESC has been pressed."""
+        if cv2.waitKey(1) == 27:  # ESC key
+            self.closed = True
+        return not self.closed
+
+    def close(self):
+        cv2.destroyWindow(self.name)
+
+
+class VideoFileSink:
+    """
+    Writes the frames to a video file, opened on the first frame to take its size.
+    """
+
+    def __init__(self, path, fps=15.0, fourcc="MJPG"):
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self._writer = None
+
+    def write(self, frame):
+        if self._writer is None:
+            height, width = frame.shape[:2]
+            self._writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, (width, height))
+        self._writer.write(frame)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.release()
+
+
+class MJPEGSink:
+    """
+    Streams the frames over HTTP as multipart JPEG, viewable in a browser at
+    http://host:port/. Frames are only encoded while a client is connected.
+    """
+
+    BOUNDARY = b"frame"
+
+    def __init__(self, port=8080, host="127.0.0.1", quality=80):
+        self.quality = quality
+        self.clients = 0
+
+        self._jpeg = None
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._closed = False
+
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=" + sink.BOUNDARY.decode())
+                self.end_headers()
+                sink._stream(self.wfile)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mjpeg", daemon=True)
+        self._thread.start()
+
+    def _stream(self, output):
+        with self._condition:
+            self.clients += 1
+        sequence = -1
+        try:
+            while True:
+                with self._condition:
+                    self._condition.wait_for(lambda: self._closed or self._sequence != sequence, timeout=1.0)
+                    if self._closed:
+                        return
+                    jpeg, sequence = self._jpeg, self._sequence
+                if jpeg is None:
+                    continue
+                output.write(b"--" + self.BOUNDARY + b"\r\nContent-Type: image/jpeg\r\n")
+                output.write(f"Content-Length: {len(jpeg)}\r\n\r\n".encode() + jpeg + b"\r\n")
+        except OSError:
+            pass  # Client went away
+        finally:
+            with self._condition:
+                self.clients -= 1
+
+    def write(self, frame):
+        if not self.clients:
+            return
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if ok:
+            with self._condition:
+                self._jpeg = jpeg.tobytes()
+                self._sequence += 1
+                self._condition.notify_all()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,104 @@
+class GazeResult:
+    """
+    What GazeTracking found on one frame, computed once when the frame is
+    analyzed. It only holds numbers, booleans and tuples and cannot be
+    modified, so it can be handed to other threads and kept after the next
+    refresh without copying or locking.
+    """
+
+    __slots__ = ("timestamp", "face", "pupils_located", "pupil_left", "pupil_right", "confidence",
+                 "horizontal_ratio", "vertical_ratio", "is_right", "is_left", "is_top", "is_bottom",
+                 "is_center", "blinking", "blink_events", "brows_raised", "brow_events")
+
+    def __init__(self, timestamp, face=None, pupil_left=None, pupil_right=None, confidence=(0.0, 0.0),
+                 horizontal_ratio=None, vertical_ratio=None, blinking=None, blink_events=(), brows_raised=None,
+                 brow_events=()):
+        """
+        Arguments:
+            timestamp (float): End of the analysis, from time.perf_counter()
+            face (tuple): (left, top, right, bottom) face rectangle, None if no face
+            pupil_left (tuple): (x, y) left pupil in the frame, None if a pupil was not located
+            pupil_right (tuple): (x, y) right pupil in the frame, None if a pupil was not located
+            confidence (tuple): (left, right) pupil confidences, between 0.0 and 1.0
+            horizontal_ratio (float): Between 0.0 and 1.0, None if the pupils were not located
+            vertical_ratio (float): Between 0.0 and 1.0, None if the pupils were not located
+            blinking (bool): True if the eyes are closed, None if no face or not followed
+            blink_events (tuple): BlinkEvent raised by the frame
+            brows_raised (bool): True during a brow raise, None if no face or not followed
+            brow_events (tuple): BrowEvent raised by the frame
+        """
+        located = pupil_left is not None and pupil_right is not None
+        values = {
+            "timestamp": timestamp,
+            "face": face,
+            "pupils_located": located,
+            "pupil_left": pupil_left if located else None,
+            "pupil_right": pupil_right if located else None,
+            "confidence": confidence if located else (0.0, 0.0),
+            "horizontal_ratio": horizontal_ratio if located else None,
+            "vertical_ratio": vertical_ratio if located else None,
+            "is_right": None,
+            "is_left": None,
+            "is_top": None,
+            "is_bottom": None,
+            "is_center": None,
+            "blinking": blinking,
+            "blink_events": tuple(blink_events),
+            "brows_raised": brows_raised,
+            "brow_events": tuple(brow_events),
+        }
+        if located:
+            values["is_right"] = horizontal_ratio <= 0.35
+            values["is_left"] = horizontal_ratio >= 0.65
+            values["is_top"] = vertical_ratio <= 0.35
+            values["is_bottom"] = vertical_ratio >= 0.65
+            values["is_center"] = not values["is_right"] and not values["is_left"]
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_eyes(cls, timestamp, face, eye_left, eye_right, blinking=None, blink_events=(), brows_raised=None,
+                  brow_events=()):
+        """Builds the result of an analyzed frame.
+
+        Arguments:
+            timestamp (float): End of the analysis, from time.perf_counter()
+            face (dlib.rectangle): Face rectangle, None if no face
+            eye_left (Eye): Analyzed left eye, None if no face
+            eye_right (Eye): Analyzed right eye, None if no face
+            blinking (bool): True if the eyes are closed
+            blink_events (list): BlinkEvent raised by the frame
+            brows_raised (bool): True during a brow raise
+            brow_events (list): BrowEvent raised by the frame
+        """
+        if face is None:
+            return cls(timestamp)
+        face = (face.left(), face.top(), face.right(), face.bottom())
+
+        pupils = []
+        for eye in (eye_left, eye_right):
+            pupil = eye.pupil
+            if pupil is None or pupil.x is None or pupil.y is None:
+                return cls(timestamp, face, blinking=blinking, blink_events=blink_events,
+                           brows_raised=brows_raised, brow_events=brow_events)
+            pupils.append(pupil)
+
+        pupil_left, pupil_right = pupils
+        horizontal = (pupil_left.x / (eye_left.center[0] * 2 - 10) + pupil_right.x / (eye_right.center[0] * 2 - 10)) / 2
+        vertical = (pupil_left.y / (eye_left.center[1] * 2 - 10) + pupil_right.y / (eye_right.center[1] * 2 - 10)) / 2
+        return cls(
+            timestamp, face,
+            (eye_left.origin[0] + pupil_left.x, eye_left.origin[1] + pupil_left.y),
+            (eye_right.origin[0] + pupil_right.x, eye_right.origin[1] + pupil_right.y),
+            (pupil_left.confidence, pupil_right.confidence),
+            horizontal, vertical, blinking, blink_events, brows_raised, brow_events)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GazeResult is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("GazeResult is immutable")
+
+    def __repr__(self):
+        return (f"GazeResult(face={self.face}, pupils=({self.pupil_left}, {self.pupil_right}), "
+                f"blinking={self.blinking})")
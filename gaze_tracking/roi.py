@@ -0,0 +1,110 @@
+import cv2
+import numpy as np
+
+# Landmarks of both eyes and eyebrows, the region watched for head motion
+EYE_REGION_POINTS = list(range(17, 27)) + list(range(36, 48))
+
+
+class AdaptiveROI:
+    """
+    This class decides when the landmarks of the previous frame can be reused.
+    The region around the eyes and eyebrows is compared with the one of the
+    last frame the landmarks were predicted on: while it has not moved and the
+    pupils were found with enough confidence, only the pupils are located again
+    and the landmarks prediction is skipped.
+
+    The head motion is the translation of the region measured by phase
+    correlation, so a moving iris alone does not count as motion.
+    """
+
+    def __init__(self, max_motion=1.0, min_confidence=0.5, max_skip=15, margin=10):
+        """
+        Arguments:
+            max_motion (float): Maximum shift in pixels of the eye region to reuse the landmarks
+            min_confidence (float): Minimum confidence of both pupils on the previous frame
+            max_skip (int): Maximum number of consecutive frames reusing the landmarks
+            margin (int): Number of pixels kept around the eye region
+        """
+        self.max_motion = max_motion
+        self.min_confidence = min_confidence
+        self.max_skip = max_skip
+        self.margin = margin
+        self.motion = None  # Shift in pixels measured on the last frame
+        self.frames = 0  # Number of frames checked
+        self.skipped = 0  # Number of frames that reused the landmarks
+        self.fallbacks = {"no_reference": 0, "confidence": 0, "max_skip": 0, "motion": 0}
+
+        self._box = None
+        self._reference = None
+        self._window = None
+        self._streak = 0
+
+    def reset(self):
+        """Forgets the reference region, the next frame predicts the landmarks."""
+        self._reference = None
+        self._streak = 0
+
+    def update(self, gray_frame, landmarks):
+        """Takes the eye region of a frame whose landmarks were just predicted as the reference.
+
+        Arguments:
+            gray_frame (numpy.ndarray): Grayscale frame
+            landmarks (numpy.ndarray): (68, 2) landmarks of the frame, None if no face was found
+        """
+        self._streak = 0
+        if landmarks is None:
+            self._reference = None
+            return
+        height, width = gray_frame.shape[:2]
+        points = landmarks[EYE_REGION_POINTS]
+        left, top = np.maximum(points.min(axis=0) - self.margin, 0).tolist()
+        right = min(int(points[:, 0].max()) + self.margin, width)
+        bottom = min(int(points[:, 1].max()) + self.margin, height)
+        if right - left < 8 or bottom - top < 8:
+            self._reference = None
+            return
+        self._box = (left, top, right, bottom)
+        self._reference = gray_frame[top:bottom, left:right].astype(np.float32)
+        if self._window is None or self._window.shape != self._reference.shape:
+            self._window = cv2.createHanningWindow(self._reference.shape[::-1], cv2.CV_32F)
+
+    def reusable(self, gray_frame, confidence):
+        """Checks if the landmarks of the reference frame still fit this frame.
+
+        Arguments:
+            gray_frame (numpy.ndarray): Grayscale frame
+            confidence (float): Lowest pupil confidence of the previous frame, 0 if a pupil was lost
+
+        Returns:
+            bool: True to reuse the landmarks, False to predict them again
+        """
+        self.frames += 1
+        self.motion = None
+        if self._reference is None:
+            reason = "no_reference"
+        elif confidence < self.min_confidence:
+            reason = "confidence"
+        elif self._streak >= self.max_skip:
+            reason = "max_skip"
+        else:
+            left, top, right, bottom = self._box
+            region = gray_frame[top:bottom, left:right].astype(np.float32)
+            (dx, dy), _ = cv2.phaseCorrelate(self._reference, region, self._window)
+            self.motion = float(np.hypot(dx, dy))
+            reason = "motion" if self.motion > self.max_motion else None
+
+        if reason is not None:
+            self.fallbacks[reason] += 1
+            return False
+        self._streak += 1
+        self.skipped += 1
+        return True
+
+    def summary(self):
+        """Returns the skip rate and the number of fallbacks to a full prediction per reason."""
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skip_rate": self.skipped / self.frames if self.frames else 0.0,
+            "fallbacks": dict(self.fallbacks),
+        }
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .multi_face import MultiFaceTracker
+from .pipeline import FramePacket
+
+
+class Stream:
+    """
+    A camera stream served by StreamServer, with its own multi-face tracker.
+    """
+
+    def __init__(self, name, capture, tracker):
+        self.name = name
+        self.capture = capture
+        self.tracker = tracker
+        self.frames = 0  # Number of frames analyzed
+
+
+class StreamServer:
+    """
+    This class serves several camera streams from one process. Frames of the
+    same stream are analyzed in order, one at a time, while different streams
+    run in parallel on a thread pool. The landmarks model is loaded once and
+    shared, and dlib's face detector and OpenCV release the GIL, so throughput
+    grows with the number of cores.
+    """
+
+    def __init__(self, workers=None, **tracker_options):
+        """
+        Arguments:
+            workers (int): Number of worker threads, os.cpu_count() if None
+            tracker_options: Keyword arguments for the MultiFaceTracker of each stream
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.tracker_options = tracker_options
+        self.streams = []
+
+        self._stop = threading.Event()
+
+    def add_stream(self, name, capture):
+        """Adds a stream to serve.
+
+        Arguments:
+            name (str): Name of the stream, reported with its results
+            capture (cv2.VideoCapture): Any object with a read() -> (ok, frame) method
+
+        Returns:
+            Stream: The new stream
+        """
+        stream = Stream(name, capture, MultiFaceTracker(**self.tracker_options))
+        self.streams.append(stream)
+        return stream
+
+    def stop(self):
+        """Makes results() return once the frames being analyzed are done."""
+        self._stop.set()
+
+    @staticmethod
+    def _step(stream):
+        """Reads and analyzes the next frame of a stream, None at the end of the stream."""
+        ok, image = stream.capture.read()
+        timestamp = time.perf_counter()
+        if not ok:
+            return None
+        packet = FramePacket(stream.frames, timestamp, image)
+        packet.result = stream.tracker.refresh(image, timestamp)
+        stream.frames += 1
+        return packet
+
+    def results(self):
+        """Serves the streams until they all end or stop() is called.
+
+        Yields:
+            tuple: (Stream, FramePacket) with packet.result the list of visible FaceTrack.
+                   The next frame of a stream is only analyzed once its previous
+                   result has been consumed.
+        """
+        self._stop.clear()
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="gaze") as pool:
+            pending = {pool.submit(self._step, stream): stream for stream in self.streams}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stream = pending.pop(future)
+                    packet = future.result()
+                    if packet is None:
+                        continue
+                    yield stream, packet
+                    if not self._stop.is_set():
+                        pending[pool.submit(self._step, stream)] = stream
@@ -0,0 +1,334 @@
+import os
+import select
+import threading
+import time
+import tty
+
+import cv2
+import numpy as np
+
+from .batch import list_images
+
+
+def _eye_points(cx, cy, half_width=28, half_height=12):
+    """The six landmarks of an almond-shaped eye, in dlib order."""
+    third = half_width // 3
+    return [
+        (cx - half_width, cy), (cx - third, cy - half_height), (cx + third, cy - half_height),
+        (cx + half_width, cy), (cx + third, cy + half_height), (cx - third, cy + half_height),
+    ]
+
+
+def _face_points(cx, cy):
+    """68 landmarks of a frontal face centred on (cx, cy), in dlib order."""
+    points = []
+    for i in range(17):  # Jaw
+        angle = np.pi * (1 - i / 16)
+        points.append((int(cx + 130 * np.cos(angle)), int(cy + 20 + 150 * np.sin(angle) ** 0.8)))
+    for i in range(5):  # Left brow
+        points.append((cx - 110 + 18 * i, cy - 60 - (8 if i in (1, 2, 3) else 0)))
+    for i in range(5):  # Right brow
+        points.append((cx + 38 + 18 * i, cy - 60 - (8 if i in (1, 2, 3) else 0)))
+    for i in range(4):  # Nose bridge
+        points.append((cx, cy - 20 + 15 * i))
+    for i in range(5):  # Nose bottom
+        points.append((cx - 20 + 10 * i, cy + 45))
+    points += _eye_points(cx - 70, cy - 20)
+    points += _eye_points(cx + 70, cy - 20)
+    for i in range(12):  # Outer lip
+        angle = 2 * np.pi * i / 12
+        points.append((int(cx - 40 * np.cos(angle)), int(cy + 90 - 15 * np.sin(angle))))
+    for i in range(8):  # Inner lip
+        angle = 2 * np.pi * i / 8
+        points.append((int(cx - 25 * np.cos(angle)), int(cy + 90 - 6 * np.sin(angle))))
+    return points
+
+
+def iris_offset(index):
+    """(dx, dy) offset of both irises from the middle of their eye in synthetic frame `index`."""
+    phase = 2 * np.pi * index / 40
+    return int(14 * np.cos(phase)), int(5 * np.sin(2 * phase))
+
+
+def iris_centers(points, index):
+    """Ground truth (x, y) centers of the left and right irises of synthetic frame `index`.
+
+    Arguments:
+        points (list): The 68 landmarks of the frame
+        index (int): Index of the frame in synthetic_face()
+    """
+    dx, dy = iris_offset(index)
+    centers = []
+    for eye in (points[36:42], points[42:48]):
+        ex, ey = np.array(eye, np.int32).mean(axis=0).astype(int)
+        centers.append((int(ex + dx), int(ey + dy)))
+    return centers
+
+
+def synthetic_face(count=120, size=(640, 480), seed=0, head_motion=1.0):
+    """Yields the frames of a synthetic face whose irises sweep left, right, up and down.
+
+    Arguments:
+        count (int): Number of frames
+        size (tuple): (width, height) of the frames
+        seed (int): Seed of the sensor noise
+        head_motion (float): Scale of the head movements, 0 for a still head
+
+    Yields:
+        tuple: (BGR frame, list of 68 (x, y) landmarks)
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    for index in range(count):
+        cx = width // 2 + int(10 * head_motion * np.sin(index / 15))
+        cy = height // 2 + int(6 * head_motion * np.cos(index / 20))
+        points = _face_points(cx, cy)
+
+        gray = np.full((height, width), 90, np.uint8)
+        cv2.ellipse(gray, (cx, cy + 10), (140, 180), 0, 0, 360, 185, -1)
+        for brow in (points[17:22], points[22:27]):
+            cv2.polylines(gray, [np.array(brow, np.int32)], False, 60, 6)
+
+        for eye, center in zip((points[36:42], points[42:48]), iris_centers(points, index)):
+            eye = np.array(eye, np.int32)
+            cv2.fillPoly(gray, [eye], 235)
+            cv2.circle(gray, center, 10, 45, -1)
+            cv2.circle(gray, center, 4, 15, -1)
+            cv2.polylines(gray, [eye], True, 70, 1)
+
+        noise = rng.normal(0, 4, gray.shape)
+        gray = np.clip(gray + noise, 0, 255).astype(np.uint8)
+        yield cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR), points
+
+
+class SyntheticFrames:
+    """The frames of synthetic_face(), generated one at a time on each iteration."""
+
+    def __init__(self, count=120, size=(640, 480), seed=0, head_motion=1.0):
+        self.options = {"count": count, "size": size, "seed": seed, "head_motion": head_motion}
+
+    def __len__(self):
+        return self.options["count"]
+
+    def __iter__(self):
+        for frame, _ in synthetic_face(**self.options):
+            yield frame
+
+
+class VideoFrames:
+    """The frames of a video file, decoded one at a time on each iteration."""
+
+    def __init__(self, path):
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open the video {path}")
+        self.path = path
+        self.count = max(int(capture.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+        capture.release()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        capture = cv2.VideoCapture(self.path)
+        try:
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    return
+                yield frame
+        finally:
+            capture.release()
+
+
+class ImageFrames:
+    """The images of a directory in name order, loaded one at a time on each iteration."""
+
+    def __init__(self, directory):
+        self.paths = list_images(directory)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __iter__(self):
+        for path in self.paths:
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield frame
+
+
+def open_frames(source):
+    """Returns the lazily read frames of a replay source.
+
+    Argument:
+        source (str): Video file, image directory, or "synthetic" for the generated face
+    """
+    if source == "synthetic":
+        return SyntheticFrames()
+    if os.path.isdir(source):
+        return ImageFrames(source)
+    return VideoFrames(source)
+
+
+class ReplayCapture:
+    """
+    Stands in for cv2.VideoCapture with recorded or synthetic frames, served at
+    the rate of a camera so the pipeline drops frames the way it would live.
+    Frames are taken from their source one at a time, so a replay holds a
+    single frame whatever the length of the recording.
+    """
+
+    def __init__(self, frames, fps=30.0, loop=False):
+        """
+        Arguments:
+            frames (iterable): BGR frames to serve, in order: a list, or a lazy source such as
+                               VideoFrames or ImageFrames (see open_frames), iterated again to loop
+            fps (float): Frames served per second, 0 to serve them as fast as they are read
+            loop (bool): Start over at the end of the frames instead of ending the stream
+        """
+        self.frames = frames
+        self.fps = fps
+        self.loop = loop
+        self.served = 0  # Number of frames read so far
+
+        self._iterator = iter(frames)
+        self._next = next(self._iterator, None)  # The first frame, read ahead for its size
+        if self._next is None:
+            raise ValueError("A replay needs at least one frame.")
+        self._shape = self._next.shape
+        self._start = None
+        self._released = False
+
+    def isOpened(self):
+        return not self._released
+
+    def _take(self):
+        """Returns the next frame of the source, None at its end."""
+        frame, self._next = self._next, None
+        if frame is None:
+            frame = next(self._iterator, None)
+        if frame is None and self.loop:
+            self._iterator = iter(self.frames)
+            frame = next(self._iterator, None)
+        return frame
+
+    def read(self, image=None):
+        """Returns (True, frame) like cv2.VideoCapture, (False, None) at the end of the replay.
+
+        Argument:
+            image (numpy.ndarray): Buffer the frame is copied to, as cv2.VideoCapture.read(image)
+                                   does, if it has the frame's size. Otherwise a copy is returned,
+                                   so the caller owns the frame either way
+        """
+        if self._released:
+            return False, None
+        frame = self._take()
+        if frame is None:
+            return False, None
+        if self.fps:
+            if self._start is None:
+                self._start = time.perf_counter()
+            delay = self._start + self.served / self.fps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        self.served += 1
+        if image is not None and image.shape == frame.shape and image.dtype == frame.dtype:
+            np.copyto(image, frame)
+            return True, image
+        return True, frame.copy()  # A list source would otherwise hand out its stored frames
+
+    def get(self, prop):
+        """Supports the frame size, rate and count properties of cv2.VideoCapture."""
+        height, width = self._shape[:2]
+        values = {
+            cv2.CAP_PROP_FRAME_WIDTH: width,
+            cv2.CAP_PROP_FRAME_HEIGHT: height,
+            cv2.CAP_PROP_FPS: self.fps,
+            cv2.CAP_PROP_FRAME_COUNT: len(self.frames) if hasattr(self.frames, "__len__") else 0,
+            cv2.CAP_PROP_POS_FRAMES: self.served,
+        }
+        return float(values.get(prop, 0.0))
+
+    def set(self, prop, value):
+        """Frame properties cannot be changed, returns False like an unsupported camera property."""
+        return False
+
+    def release(self):
+        self._released = True
+        close = getattr(self._iterator, "close", None)
+        if close is not None:  # Releases the video of a generator
+            close()
+
+
+class VirtualSerialPort:
+    """
+    A pseudo-terminal standing in for the vehicle. The dispatcher writes to
+    `port` through a regular SerialTransport, and every byte reaching the other
+    end is recorded with the time it arrived.
+    """
+
+    def __init__(self):
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._master)
+        self.port = os.ttyname(self._slave)  # Path to open with SerialTransport
+        self.trace = []  # List of (time.perf_counter() seconds, command byte)
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._read_loop, name="virtual-serial", daemon=True)
+        self._thread.start()
+
+    def _read(self, timeout):
+        """Records the bytes waiting on the master side, returns False if there were none."""
+        ready, _, _ = select.select([self._master], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            data = os.read(self._master, 1024)
+        except OSError:
+            return False
+        now = time.perf_counter()
+        self.trace.extend((now, data[i:i + 1]) for i in range(len(data)))
+        return bool(data)
+
+    def _read_loop(self):
+        while not self._stop.is_set():
+            self._read(0.05)
+
+    def close(self):
+        """Records the bytes still in flight, then closes both ends of the pty."""
+        self._stop.set()
+        self._thread.join(1.0)
+        while self._read(0.05):
+            pass
+        os.close(self._master)
+        os.close(self._slave)
+
+
+def command_report(trace, start, end, latency=None):
+    """Summarizes the commands received by the vehicle during a run.
+
+    Arguments:
+        trace (list): (time.perf_counter() seconds, command byte) tuples, e.g. the
+                      trace of a LoopbackTransport or a VirtualSerialPort
+        start (float): Start of the run, from time.perf_counter()
+        end (float): End of the run, from time.perf_counter()
+        latency (LatencyMeter): Capture to command latency of the run
+
+    Returns:
+        dict: Command count, throughput, transitions, per-command counts,
+              latency and the trace with times relative to the start
+    """
+    duration = max(end - start, 1e-9)
+    commands = [command for _, command in trace]
+    transitions = sum(1 for previous, command in zip([None] + commands, commands) if command != previous)
+    gaps = np.diff([timestamp for timestamp, _ in trace]) * 1000
+    return {
+        "duration_s": duration,
+        "commands": len(commands),
+        "commands_per_s": len(commands) / duration,
+        "transitions": transitions,
+        "counts": {command.decode(): commands.count(command) for command in sorted(set(commands))},
+        "max_gap_ms": float(gaps.max()) if len(gaps) else None,
+        "latency_ms": latency.summary() if latency is not None else None,
+        "trace": [[round(timestamp - start, 6), command.decode()] for timestamp, command in trace],
+    }
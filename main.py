@@ -1,138 +1,329 @@
-import os
-import threading
 import time
-from collections import Counter
+
+_process_start = time.perf_counter()
+
+import argparse
+import json
+import logging
+import os
+import queue
 
 import cv2
-import numpy as np
 import serial
 
-from gaze_tracking import GazeTracking
-
-# Initialize GazeTracking and webcam
-gaze = GazeTracking()
-webcam = cv2.VideoCapture(0)
-new_frame = np.zeros((500, 500, 3), np.uint8)
-
-# Initialize serial communication
-try:
-    ser = serial.Serial(port="/dev/cu.HC-06", baudrate=9600, timeout=1)
-except serial.SerialException as e:
-    print(f"Error opening serial port: {e}")
-    ser = None
-
-eye_direction = ""
-
-def track_eye_direction():
-    global eye_direction
-    while True:
-        if ser:
-            if eye_direction == "Up":
-                new_frame[:] = (255, 255, 0)
-                ser.write(b'F')
-            elif eye_direction == "Down":
-                new_frame[:] = (0, 255, 255)
-                ser.write(b'B')
-            elif eye_direction == "Right":
-                new_frame[:] = (0, 0, 255)
-                ser.write(b'L')
-            elif eye_direction == "Left":
-                new_frame[:] = (255, 0, 0)
-                ser.write(b'R')
-            elif eye_direction == "Center":
-                new_frame[:] = (255, 255, 255)
-                ser.write(b'F')
-            time.sleep(1.5)
-        print(eye_direction)
-        eye_direction = ""
-        time.sleep(0.5)
-
-def determine_eye_direction(points, eye, pupil_coords, pupils_located, calibration, landmarks_ids, frame):
-    global eye_direction
-    point_distances = {point: np.linalg.norm(
-        np.array([eye.landmarks.part(point).x, eye.landmarks.part(point).y]) - np.array(pupil_coords)) for point in points}
-    if abs(eye.landmark_bottom[1] - eye.landmark_top[1]) / calibration.get_avg_height() <= 0.6 and pupils_located:
-        eye_direction = "Down"
-    else:
-        right_group, left_group, up_group, down_group, center_group = landmarks_ids
-        look_values = [
-            np.mean([point_distances[x] for x in left_group]) * 0.9,
-            np.mean([point_distances[x] for x in right_group]) * 0.9,
-            np.mean([point_distances[x] for x in up_group]),
-            np.mean([point_distances[x] for x in center_group]) * 0.72
-        ]
-        directions = ['Left', 'Right', 'Up', 'Center']
-        eye_direction = directions[np.argmin(look_values)]
-        for point in landmarks_ids[np.argmin(look_values)]:
-            cv2.circle(frame, (eye.landmarks.part(point).x, eye.landmarks.part(point).y), 2, (0, 255, 0), cv2.FILLED)
+from gaze_tracking import GazeTracking, direction, models
+from gaze_tracking.calibration import Calibration
+from gaze_tracking.capture import BufferedCapture
+from gaze_tracking.decision import DecisionEngine, OneEuroFilter
+from gaze_tracking.eye import Eye
+from gaze_tracking.eyebrows import EyeBrow
+from gaze_tracking.dispatcher import CommandDispatcher, LoopbackTransport, SerialTransport
+from gaze_tracking.pipeline import LatencyMeter, Pipeline
+from gaze_tracking.profiling import Profiler, RateLimitedLog, StartupReport
+from gaze_tracking.recording import SessionRecorder
+from gaze_tracking.roi import AdaptiveROI
+from gaze_tracking.rendering import FONT_COLOR, MJPEGSink, Overlay, Renderer, VideoFileSink, WindowSink
+from gaze_tracking.simulation import ReplayCapture, VirtualSerialPort, command_report, open_frames
+
+logger = logging.getLogger("main")
+command_log = RateLimitedLog(logger, interval=1.0)  # Transitions can flicker several times per second
+
+startup = StartupReport(_process_start)
+startup.mark("imports")
+
+# Initialize GazeTracking (the model is loaded by main() or on the first frame),
+# the camera and the serial link are opened by main()
+gaze = GazeTracking(tracking_mode="landmarks", redetect_interval=30, features=("blink", "brow_raise"))
+webcam = None
+dispatcher = None
+command_latency = LatencyMeter()  # Capture to serial command latency
+recorder = None  # SessionRecorder of --session
+
+def log_command(command, is_transition):
+    # Runs on the dispatcher thread: only the byte written is known there
+    if is_transition:
+        command_log.log("command", "command %s sent", command)
+
+def determine_eye_direction(points, eye, pupil_coords, pupils_located, calibration, landmarks_ids, overlay):
+    eye_direction, group = direction.determine_eye_direction(
+        points, eye, pupil_coords, pupils_located, calibration, landmarks_ids)
+    if overlay is not None:
+        overlay.highlights.extend(tuple(eye.landmarks[point].tolist()) for point in group or [])
     return eye_direction
 
-left_history = []
-right_history = []
-text = ""
+# Streaming decision over both eyes, and One Euro filters smoothing the pupils
+decision = DecisionEngine()
+pupil_filters = (OneEuroFilter(), OneEuroFilter())
+renderer = None  # No drawing at all when headless without any sink
 
-def process_webcam_frame():
-    global left_history, right_history, text
-    _, frame = webcam.read()
-    gaze.refresh(frame)
-    frame = gaze.annotated_frame()
-    left_pupil, right_pupil = gaze.pupil_left_coords(), gaze.pupil_right_coords()
+def process_webcam_frame(packet):
+    """Analyzes a frame and sends its command. Returns the Overlay to draw, None without a renderer."""
+    result = gaze.refresh(packet.image, packet.timestamp)
+    if packet.index == 0:
+        startup.mark("first_frame")
+    overlay = Overlay() if renderer is not None else None
+    for event in result.blink_events + result.brow_events:
+        logger.info("%s", event)
 
-    if gaze.pupils_located:
-        highlight_eye_landmarks(frame, gaze)
+    name = None
+    if gaze.blink.long_closed:
+        name = "Stop"
+        dispatcher.submit(name, packet.timestamp)
+        decision.update(None, None, timestamp=packet.timestamp)
+    elif result.pupils_located:
+        left_pupil = pupil_filters[0].filter(result.pupil_left, packet.timestamp)
+        right_pupil = pupil_filters[1].filter(result.pupil_right, packet.timestamp)
         left_dir = determine_eye_direction(
-            [36, 37, 38, 39, 40, 41], gaze.eye_left, left_pupil, gaze.pupils_located, gaze.calibration,
-            [[36, 37, 41], [38, 40, 39], [37, 38], [40, 41], [41, 40]], frame)
+            Eye.LEFT_EYE_POINTS, gaze.eye_left, left_pupil, True, gaze.calibration,
+            direction.LEFT_EYE_GROUPS, overlay)
         right_dir = determine_eye_direction(
-            [42, 43, 44, 45, 46, 47], gaze.eye_right, right_pupil, gaze.pupils_located, gaze.calibration,
-            [[42, 43, 47], [46, 44, 45], [43, 44], [46, 47], [46, 47]], frame)
-        update_eye_direction_history(left_dir, right_dir)
-
-        if not gaze.calibration.is_complete():
-            cv2.putText(frame, "Calibrating...", (90, 100), cv2.FONT_HERSHEY_DUPLEX, 1.6, (147, 58, 31), 2)
-
-        draw_face_rectangle(frame, gaze)
-
-    cv2.putText(frame, text, (90, 60), cv2.FONT_HERSHEY_DUPLEX, 1.6, (147, 58, 31), 2)
-    cv2.imshow("Direction", frame)
-
-def highlight_eye_landmarks(frame, gaze):
-    left_eye, right_eye = gaze.eye_left, gaze.eye_right
-    for eye in [left_eye, right_eye]:
-        for point in eye.landmark_points:
-            cv2.circle(frame, point, 2, (0, 0, 255), cv2.FILLED)
-    for brow in [gaze.brow_left, gaze.brow_right]:
-        for point in brow.landmark_points:
-            cv2.circle(frame, point, 2, (0, 0, 255), cv2.FILLED)
-
-def update_eye_direction_history(left_dir, right_dir):
-    global left_history, right_history, text
-    left_history.append(left_dir)
-    right_history.append(right_dir)
-    if len(left_history) % 10 == 0 and left_history:
-        left_most_dir = Counter(left_history).most_common(1)[0][0]
-        right_most_dir = Counter(right_history).most_common(1)[0][0]
-        left_history, right_history = [], []
-        text = left_most_dir if left_most_dir == right_most_dir else "Unknown"
-
-def draw_face_rectangle(frame, gaze):
+            Eye.RIGHT_EYE_POINTS, gaze.eye_right, right_pupil, True, gaze.calibration,
+            direction.RIGHT_EYE_GROUPS, overlay)
+        decision.update(left_dir, right_dir, *result.confidence, packet.timestamp)
+        name = decision.decision
+        dispatcher.submit(name, packet.timestamp)
+    else:
+        for pupil_filter in pupil_filters:
+            pupil_filter.reset()
+        decision.update(None, None, timestamp=packet.timestamp)
+    if recorder is not None:
+        recorder.add(packet.timestamp, packet.index, gaze, name, dispatcher.current)
+
+    if overlay is not None:
+        if result.pupils_located:
+            overlay.pupils = [result.pupil_left, result.pupil_right]
+            highlight_eye_landmarks(overlay, gaze)
+            if not gaze.calibration.is_complete():
+                overlay.add_label("Calibrating...", (90, 100), 1.6, 2)
+            overlay.face = result.face
+        overlay.add_label("Stop" if gaze.blink.long_closed else decision.decision, (90, 60), 1.6, 2)
+        if result.blinking:
+            overlay.add_label("Eyes closed", (90, 140), 1.2, 2)
+        elif result.brows_raised:
+            overlay.add_label("Brows raised", (90, 140), 1.2, 2)
+        draw_timings(overlay, gaze, packet.image.shape[0])
+    return overlay
+
+def highlight_eye_landmarks(overlay, gaze):
+    # Straight from the landmarks, so the eyebrow regions are never isolated
+    for points in [Eye.LEFT_EYE_POINTS, Eye.RIGHT_EYE_POINTS, EyeBrow.LEFT_BROW_POINTS, EyeBrow.RIGHT_BROW_POINTS]:
+        overlay.points.extend(map(tuple, gaze.landmarks[points].tolist()))
+
+def draw_timings(overlay, gaze, height):
+    timings = gaze.timings
+    face_ms = timings.get("detect", timings.get("track", 0.0))
+    label = "detect" if "detect" in timings else "track"
+    summary = f"{label} {face_ms:.1f} ms | landmarks {timings.get('landmarks', 0.0):.1f} ms | " \
+              f"eyes {timings.get('eyes', 0.0):.1f} ms | total {timings.get('total', 0.0):.1f} ms"
+    overlay.add_label(summary, (10, height - 10))
+
+def draw_latency(frame, pipeline):
+    latency = command_latency.summary()
+    if "p50" in latency:
+        summary = f"capture->command p50 {latency['p50']:.0f} ms | p95 {latency['p95']:.0f} ms | " \
+                  f"dropped {pipeline.frames.dropped}"
+        cv2.putText(frame, summary, (10, frame.shape[0] - 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, FONT_COLOR, 1)
+
+def decorate(frame, pipeline, args):
+    draw_latency(frame, pipeline)
+    if args.profile:
+        gaze.profiler.draw(frame, origin=(10, 130))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Eye-controlled vehicle")
+    parser.add_argument("--profile", action="store_true", help="Collect per-stage timings and show them on screen")
+    parser.add_argument("--metrics-file", help="JSON file the metrics are periodically written to")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, help="Seconds between two metrics dumps")
+    parser.add_argument("--calibration-profile", default="calibration_profile.json",
+                        help="Calibration profile loaded at startup and saved on exit")
+    parser.add_argument("--recalibrate", action="store_true", help="Ignore the saved calibration profile")
+    parser.add_argument("--adapt-interval", type=int, default=30,
+                        help="Frames between two calibration updates once calibrated (0 to disable)")
+    parser.add_argument("--model", default=models.DEFAULT_MODEL_PATH,
+                        help=f"Landmarks model, also looked for in ${models.MODEL_PATH_VARIABLE} and "
+                             f"{', '.join(models.MODEL_DIRS)}")
+    parser.add_argument("--source", default="0",
+                        help="Camera index, video file, image directory, or 'synthetic' for a generated face")
+    parser.add_argument("--fps", type=float, default=30.0,
+                        help="Replay rate of a video, image or synthetic source (0 for as fast as possible)")
+    parser.add_argument("--width", type=int, help="Frame width requested from the camera")
+    parser.add_argument("--height", type=int, help="Frame height requested from the camera")
+    parser.add_argument("--fourcc", help="Pixel format requested from the camera, e.g. MJPG or YUYV")
+    parser.add_argument("--loop", action="store_true", help="Replay the source in a loop until interrupted")
+    parser.add_argument("--serial-port", default="/dev/cu.HC-06",
+                        help="Serial port of the vehicle, 'pty' for a virtual one, 'loopback' for none")
+    parser.add_argument("--headless", action="store_true", help="Run without a window")
+    parser.add_argument("--render-fps", type=float, default=15.0,
+                        help="Maximum frames drawn per second, whatever the inference rate (0 for all)")
+    parser.add_argument("--mjpeg-port", type=int, help="Stream the annotated frames over HTTP on this port")
+    parser.add_argument("--record", help="Video file the annotated frames are written to")
+    parser.add_argument("--session", help="Binary file the per-frame telemetry is recorded to "
+                                          "(read with python -m gaze_tracking.recording)")
+    parser.add_argument("--report", help="JSON file the command throughput, latency and trace are written to")
+    parser.add_argument("--adaptive-roi", action="store_true",
+                        help="Reuse the previous landmarks while the head is stable")
+    parser.add_argument("--batch-eyes", action="store_true",
+                        help="Smooth and binarize both eye frames in one call. Slower for a single face, "
+                             "only to compare with the default path (see benchmarks.batched_eyes)")
+    parser.add_argument("--decision-mode", default="hysteresis", choices=DecisionEngine.MODES,
+                        help="Voting of the direction decision over the last frames: 'hysteresis' follows "
+                             "new directions twice as fast as a 10-frame batch vote with few more flips, "
+                             "'ewma' reacts faster still but flips "
+                             "about twice as often on noisy eyes (see benchmarks.decision)")
+    return parser.parse_args()
+
+def open_capture(args):
+    """Returns the frame source: frames are read into reused buffers, and only
+    their luminance is kept when nothing displays them."""
+    gray = args.headless and not args.mjpeg_port and not args.record
+    if args.source.isdigit():
+        return BufferedCapture(cv2.VideoCapture(int(args.source)), gray=gray, width=args.width,
+                               height=args.height, fourcc=args.fourcc)
+    # Replays read one frame at a time, whatever the length of the recording
+    return BufferedCapture(ReplayCapture(open_frames(args.source), args.fps, args.loop), gray=gray)
+
+def open_transport(port):
+    """Returns (transport, virtual port or None)."""
+    if port == "loopback":
+        return LoopbackTransport(), None
+    virtual_port = None
+    if port == "pty":
+        virtual_port = VirtualSerialPort()
+        port = virtual_port.port
     try:
-        face = gaze.face
-        x, y, w, h = face.left(), face.top(), face.right() - face.left(), face.bottom() - face.top()
-        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-    except Exception:
-        pass
+        return SerialTransport(port=port, baudrate=9600, timeout=1), virtual_port
+    except serial.SerialException as e:
+        logger.error("Error opening serial port: %s", e)
+        return LoopbackTransport(), virtual_port
+
+def camera_metadata(args):
+    resolution = [int(webcam.get(cv2.CAP_PROP_FRAME_WIDTH)), int(webcam.get(cv2.CAP_PROP_FRAME_HEIGHT))]
+    return {"camera": args.source, "resolution": resolution}
+
+def load_calibration(args):
+    if not args.recalibrate and os.path.exists(args.calibration_profile):
+        try:
+            gaze.calibration = Calibration.load(args.calibration_profile, args.adapt_interval, **camera_metadata(args))
+            logger.info("Calibration loaded from %s", args.calibration_profile)
+            return
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Ignoring calibration profile: %s", e)
+    gaze.calibration.adapt_interval = args.adapt_interval
+
+def write_report(args, transport, virtual_port, start, end):
+    if virtual_port is not None:
+        trace = virtual_port.trace
+    elif isinstance(transport, LoopbackTransport):
+        trace = transport.trace
+    else:
+        trace = [(timestamp, command) for timestamp, command, _ in dispatcher.trace]
+    report = command_report(trace, start, end, command_latency)
+    report["frames"] = {"served": getattr(webcam, "served", None), "analyzed": decision.metrics.frames,
+                        "fps": decision.metrics.frames / report["duration_s"]}
+    report["decision"] = decision.metrics.summary()
+    report["blinks"] = {"blinks": gaze.blink.blinks, "closures": gaze.blink.closures}
+    report["brow_raises"] = gaze.brows.raises
+    report["startup_ms"] = startup.summary()
+    # Counted by the dispatcher: its trace is only kept whole with --report
+    logger.info("%d frames analyzed (%.1f fps), %d commands (%.1f/s, %d transitions)",
+                report["frames"]["analyzed"], report["frames"]["fps"], dispatcher.sent,
+                dispatcher.sent / report["duration_s"], dispatcher.transitions)
+    if args.report:
+        with open(args.report, "w") as file:
+            json.dump(report, file, indent=2)
+
+def open_renderer(args):
+    sinks = [] if args.headless else [WindowSink("Direction")]
+    if args.mjpeg_port:
+        sinks.append(MJPEGSink(args.mjpeg_port))
+        logger.info("Streaming annotated frames on http://127.0.0.1:%d/", args.mjpeg_port)
+    if args.record:
+        sinks.append(VideoFileSink(args.record, args.render_fps or args.fps or 30.0))
+    return Renderer(sinks, args.render_fps or None) if sinks else None
+
+def report_startup():
+    for seconds in models.load_times().values():
+        startup.record("model", seconds * 1000)
+    startup.log()
 
 def main():
-    eye_thread = threading.Thread(target=track_eye_direction)
-    eye_thread.start()
-    while True:
-        key = cv2.waitKey(1)
-        process_webcam_frame()
-        if key == 27:  # ESC key to exit
-            break
+    global decision, dispatcher, recorder, renderer, webcam
+    with startup.phase("args"):
+        args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    # The model loads in the background while the camera and the serial port open
+    gaze.model_path = args.model
+    models.warm_up(args.model)
+    decision = DecisionEngine(mode=args.decision_mode)
+    with startup.phase("camera"):
+        webcam = open_capture(args)
+    with startup.phase("serial"):
+        transport, virtual_port = open_transport(args.serial_port)
+    # Without a known direction for 0.5 s (no face, no pupils, "Unknown"), the vehicle is stopped.
+    # The report of a real serial port is built from the dispatcher trace, kept whole in that case
+    dispatcher = CommandDispatcher(transport, keepalive_interval=1.0, min_dwell=0.3, latency=command_latency,
+                                   on_send=log_command, expiry=0.5, trace_size=None if args.report else 1000)
+    if args.profile or args.metrics_file:
+        gaze.profiler = Profiler(dump_interval=args.metrics_interval, dump_path=args.metrics_file)
+    with startup.phase("calibration"):
+        load_calibration(args)
+    if args.adaptive_roi:
+        gaze.adaptive_roi = AdaptiveROI()
+    gaze.batch_eyes = args.batch_eyes
+    with startup.phase("renderer"):
+        renderer = open_renderer(args)
+    if args.session:
+        recorder = SessionRecorder(args.session, {"pupil_engine": gaze.pupil_engine, **camera_metadata(args)})
+    window = next((sink for sink in renderer.sinks if isinstance(sink, WindowSink)), None) if renderer else None
+    dispatcher.start()
+    pipeline = Pipeline(webcam, process_webcam_frame, queue_size=1)
+    start = time.perf_counter()
+    pipeline.start()
+    startup.mark("ready")
+    reported = False
+    try:
+        while pipeline.running:
+            try:
+                packet = pipeline.results.get(timeout=0.1)
+            except queue.Empty:
+                packet = None
+            if packet is not None and not reported:
+                report_startup()
+                reported = True
+            if packet is not None:
+                if packet.result is not None:
+                    renderer.render(packet.image, packet.result, lambda frame: decorate(frame, pipeline, args))
+                pipeline.release(packet)
+            if window is not None and not window.poll():
+                break
+    except KeyboardInterrupt:
+        pass
+    pipeline.stop()
+    for error in pipeline.errors:
+        logger.error("Pipeline error: %r", error)
+    dispatcher.stop()
+    end = time.perf_counter()
+    if recorder is not None:
+        recorder.close()
+        logger.info("Session: %d frames written to %s, %d dropped", recorder.written, args.session,
+                    recorder.dropped)
+    if virtual_port is not None:
+        virtual_port.close()
+    write_report(args, transport, virtual_port, start, end)
+    logger.info("Capture to command latency: %s", command_latency.summary())
+    logger.info("Direction decision: %s", decision.metrics.summary())
+    logger.info("Blinks: %d, long closures: %d, brow raises: %d", gaze.blink.blinks, gaze.blink.closures,
+                gaze.brows.raises)
+    if gaze.adaptive_roi is not None:
+        logger.info("Adaptive ROI: %s", gaze.adaptive_roi.summary())
+    if gaze.profiler.enabled:
+        gaze.profiler.dump()
+    if gaze.calibration.is_complete():
+        gaze.calibration.save(args.calibration_profile, **camera_metadata(args))
+    if renderer is not None:
+        logger.info("Rendered %d frames, skipped %d", renderer.rendered, renderer.skipped)
+        renderer.close()
     webcam.release()
-    cv2.destroyAllWindows()
 
 if __name__ == "__main__":
     main()
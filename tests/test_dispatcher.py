@@ -0,0 +1,107 @@
+import time
+
+from gaze_tracking.dispatcher import CommandDispatcher, LoopbackTransport
+
+
+def run(dispatcher, seconds, submit=None, interval=0.02):
+    """Runs the dispatcher thread for a while, submitting a direction every `interval` seconds."""
+    dispatcher.start()
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        if submit is not None:
+            dispatcher.submit(submit)
+        time.sleep(interval)
+    dispatcher.stop()
+
+
+def commands(transport):
+    return [command for _, command in transport.trace]
+
+
+def test_transition_is_written_once():
+    transport = LoopbackTransport()
+    dispatcher = CommandDispatcher(transport, keepalive_interval=None)
+    run(dispatcher, 0.2, "Left")
+    assert commands(transport) == [b'R']
+    assert dispatcher.transitions == 1
+    assert transport.closed
+
+
+def test_keepalive_resends_the_current_command():
+    transport = LoopbackTransport()
+    dispatcher = CommandDispatcher(transport, keepalive_interval=0.1)
+    run(dispatcher, 0.55, "Up")
+    assert set(commands(transport)) == {b'F'}
+    assert 4 <= len(transport.trace) <= 7
+    assert dispatcher.transitions == 1
+
+
+def test_min_dwell_delays_the_next_transition():
+    transport = LoopbackTransport()
+    dispatcher = CommandDispatcher(transport, keepalive_interval=None, min_dwell=0.3)
+    dispatcher.start()
+    dispatcher.submit("Left")
+    time.sleep(0.05)
+    dispatcher.submit("Right")
+    time.sleep(0.1)
+    assert commands(transport) == [b'R']
+    time.sleep(0.3)
+    dispatcher.stop()
+    assert commands(transport) == [b'R', b'L']
+    (left_time, _), (right_time, _) = transport.trace
+    assert right_time - left_time >= 0.29
+
+
+def test_short_flicker_within_dwell_is_not_sent():
+    transport = LoopbackTransport()
+    dispatcher = CommandDispatcher(transport, keepalive_interval=None, min_dwell=0.3)
+    dispatcher.start()
+    dispatcher.submit("Left")
+    time.sleep(0.05)
+    dispatcher.submit("Right")
+    time.sleep(0.05)
+    dispatcher.submit("Left")
+    time.sleep(0.4)
+    dispatcher.stop()
+    assert commands(transport) == [b'R']
+
+
+def test_unknown_direction_is_ignored():
+    dispatcher = CommandDispatcher(LoopbackTransport())
+    assert not dispatcher.submit("Unknown")
+    assert dispatcher.submit("Up")
+
+
+def test_expired_command_falls_back_to_stop():
+    transport = LoopbackTransport()
+    dispatcher = CommandDispatcher(transport, keepalive_interval=0.1, expiry=0.2)
+    dispatcher.start()
+    dispatcher.submit("Up")
+    time.sleep(0.05)
+    dispatcher.submit("Unknown")  # The face is lost: nothing known is submitted anymore
+    time.sleep(0.6)
+    dispatcher.stop()
+    sent = commands(transport)
+    assert sent[0] == b'F'
+    assert b'S' in sent
+    assert set(sent[sent.index(b'S'):]) == {b'S'}
+
+
+def test_expiry_without_stop_command_stops_sending():
+    transport = LoopbackTransport()
+    dispatcher = CommandDispatcher(transport, commands={"Up": b'F'}, keepalive_interval=0.05, expiry=0.15)
+    dispatcher.start()
+    dispatcher.submit("Up")
+    time.sleep(0.3)
+    sent = len(transport.trace)
+    time.sleep(0.3)
+    dispatcher.stop()
+    assert len(transport.trace) == sent
+    assert dispatcher.current is None
+
+
+def test_submitted_direction_does_not_expire():
+    transport = LoopbackTransport()
+    dispatcher = CommandDispatcher(transport, keepalive_interval=0.1, expiry=0.1)
+    run(dispatcher, 0.5, "Up")
+    assert set(commands(transport)) == {b'F'}